@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Throughput of AsyncGenericDAO selects by primary key on a file-backed SQLite database
+as the number of concurrent coroutines (and pool size) grows.
+
+Usage: python -m benchmarks.async_dao [queries]
+'''
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from pydao.orm.async_dao import AsyncGenericDAO
+from pydao.orm.dao import GenericDAO
+from pydao.orm.db import DriverManager
+from pydao.orm.models import Produto
+
+
+async def run(pool, queries, concurrency):
+    async with AsyncGenericDAO(pool=pool, model=Produto, max_workers=concurrency) as dao:
+        ids = iter(range(queries))
+
+        async def worker():
+            for i in ids:
+                await dao.select(where='id = ?', params=(i % 1000 + 1,))
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for n in range(concurrency)])
+        return time.perf_counter() - start
+
+
+def main(queries=5000):
+    path = os.path.join(tempfile.mkdtemp(), 'pydao.db')
+    conn = DriverManager.connection(dbms='sqlite', database=path, auto_commit=True)
+    conn.cursor.execute('CREATE TABLE produtos (id INTEGER PRIMARY KEY, nome TEXT, preco REAL)')
+    GenericDAO(connection=conn, model=Produto).insert_many(
+        [{'nome': 'Produto %d' % i, 'preco': float(i)} for i in range(1000)])
+    conn.close()
+    print('%d selects by id' % queries)
+    for concurrency in (1, 2, 4, 8, 16):
+        pool = DriverManager.pool(dbms='sqlite', database=path, auto_commit=True,
+                                  min_size=concurrency, max_size=concurrency)
+        elapsed = asyncio.run(run(pool, queries, concurrency))
+        print('concurrency %2d: %8.0f queries/s' % (concurrency, queries / elapsed))
+        pool.close()
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
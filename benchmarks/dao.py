@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+GenericDAO operations against the same statements run straight on sqlite3, on in-memory and
+file-backed SQLite databases and several table sizes: ops/s, p50/p99 latency and peak memory
+(traced in a second run, so it does not slow down the timed one).
+
+Usage: python -m benchmarks.dao [--sizes 1000,10000] [--storage memory,file] [--ops 2000]
+                                [--cases select_id,full_scan] [--json results.json]
+'''
+
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pydao.orm.dao import GenericDAO
+from pydao.orm.db import DriverManager
+from pydao.orm.models import Produto
+
+SCHEMA = 'CREATE TABLE produtos (id INTEGER PRIMARY KEY, nome TEXT, preco REAL)'
+
+
+def rows(size):
+    return [{'nome': 'Produto %d' % i, 'preco': float(i)} for i in range(size)]
+
+
+def database(storage, size, directory):
+    # A new database with size registers, the file of the previous run is removed.
+    if storage == 'memory':
+        path = ':memory:'
+    else:
+        path = os.path.join(directory, 'pydao.db')
+        if os.path.exists(path):
+            os.remove(path)
+    conn = DriverManager.connection(dbms='sqlite', database=path, auto_commit=True)
+    cursor = conn.reference.cursor()
+    cursor.execute(SCHEMA)
+    cursor.executemany('INSERT INTO produtos (nome, preco) VALUES (?, ?)',
+                       [(r['nome'], r['preco']) for r in rows(size)])
+    return conn
+
+
+# Each case returns (operation, number of operations, rows per operation), operation(i) runs the i-th one.
+# The pydao and sqlite3 versions of a case run the same statements.
+
+def insert(conn, impl, size, ops):
+    data = rows(ops)
+    if impl == 'pydao':
+        dao = GenericDAO(conn, Produto)
+        return lambda i: dao.insert(settings=dict(data[i])), ops, 1
+    cursor = conn.reference.cursor()
+    return lambda i: cursor.execute('INSERT INTO produtos (nome, preco) VALUES (?, ?)',
+                                    (data[i]['nome'], data[i]['preco'])), ops, 1
+
+
+def insert_many(conn, impl, size, ops):
+    data = rows(size)
+    if impl == 'pydao':
+        dao = GenericDAO(conn, Produto)
+        return lambda i: dao.insert_many(data), 1, size
+    tuples = [(r['nome'], r['preco']) for r in data]
+
+    def operation(i):
+        cursor = conn.reference.cursor()
+        cursor.execute('BEGIN')
+        cursor.executemany('INSERT INTO produtos (nome, preco) VALUES (?, ?)', tuples)
+        cursor.execute('COMMIT')
+    return operation, 1, size
+
+
+def select_id(conn, impl, size, ops):
+    if impl == 'pydao':
+        dao = GenericDAO(conn, Produto)
+        return lambda i: dao.select(where='id = ?', params=(i % size + 1,)), ops, 1
+    cursor = conn.reference.cursor()
+
+    def operation(i):
+        cursor.execute('SELECT * FROM produtos WHERE id = ?', (i % size + 1,))
+        return cursor.fetchall()
+    return operation, ops, 1
+
+
+def full_scan(conn, impl, size, ops):
+    if impl == 'pydao':
+        dao = GenericDAO(conn, Produto)
+        return lambda i: dao.select(), 5, size
+    cursor = conn.reference.cursor()
+
+    def operation(i):
+        cursor.execute('SELECT * FROM produtos')
+        return cursor.fetchall()
+    return operation, 5, size
+
+
+def full_scan_objects(conn, impl, size, ops):
+    if impl == 'pydao':
+        dao = GenericDAO(conn, Produto)
+        return lambda i: dao.select_objects(), 5, size
+    cursor = conn.reference.cursor()
+
+    def operation(i):
+        cursor.execute('SELECT * FROM produtos')
+        objs = []
+        for row in cursor.fetchall():
+            p = Produto()
+            p.id, p.nome, p.preco = row
+            objs.append(p)
+        return objs
+    return operation, 5, size
+
+
+def fill(conn, impl, size, ops):
+    if impl == 'pydao':
+        dao = GenericDAO(conn, Produto)
+
+        def operation(i):
+            p = Produto()
+            p.id = i % size + 1
+            dao.fill(p)
+            return p
+        return operation, ops, 1
+    cursor = conn.reference.cursor()
+
+    def operation(i):
+        p = Produto()
+        p.id = i % size + 1
+        cursor.execute('SELECT * FROM produtos WHERE id = ?', (p.id,))
+        p.id, p.nome, p.preco = cursor.fetchone()
+        return p
+    return operation, ops, 1
+
+
+def update(conn, impl, size, ops):
+    ops = min(ops, size)
+    if impl == 'pydao':
+        dao = GenericDAO(conn, Produto)
+        objs = dao.select_objects(where='id <= ?', params=(ops,))
+
+        def operation(i):
+            p = objs[i]
+            p.preco = p.preco + 1
+            dao.update(p)
+        return operation, ops, 1
+    cursor = conn.reference.cursor()
+    return lambda i: cursor.execute('UPDATE produtos SET preco = preco + 1 WHERE id = ?', (i + 1,)), ops, 1
+
+
+def delete(conn, impl, size, ops):
+    ops = min(ops, size)
+    if impl == 'pydao':
+        dao = GenericDAO(conn, Produto)
+        return lambda i: dao.delete(where={'id': i + 1}), ops, 1
+    cursor = conn.reference.cursor()
+    return lambda i: cursor.execute('DELETE FROM produtos WHERE id = ?', (i + 1,)), ops, 1
+
+
+def export_csv(conn, impl, size, ops):
+    if impl == 'pydao':
+        dao = GenericDAO(conn, Produto)
+        return lambda i: dao.export(io.StringIO()), 5, size
+
+    def operation(i):
+        cursor = conn.reference.cursor()
+        cursor.execute('SELECT * FROM produtos')
+        writer = csv.writer(io.StringIO())
+        writer.writerow([d[0] for d in cursor.description])
+        while True:
+            rows = cursor.fetchmany(10000)
+            if not rows:
+                break
+            writer.writerows(rows)
+    return operation, 5, size
+
+
+CASES = (insert, insert_many, select_id, full_scan, full_scan_objects, fill, update, delete, export_csv)
+
+
+def percentile(timings, percent):
+    return timings[min(len(timings) - 1, int(len(timings) * percent / 100.0))]
+
+
+def measure(case, impl, storage, size, ops, directory):
+    # Timed run.
+    conn = database(storage, size, directory)
+    operation, count, rows_per_op = case(conn, impl, size, ops)
+    timings = []
+    clock = time.perf_counter
+    start = clock()
+    for i in range(count):
+        t = clock()
+        operation(i)
+        timings.append(clock() - t)
+    elapsed = clock() - start
+    conn.close()
+    # Traced run (peak memory of the operations, not of the setup).
+    conn = database(storage, size, directory)
+    operation, count, rows_per_op = case(conn, impl, size, ops)
+    tracemalloc.start()
+    for i in range(count):
+        operation(i)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    conn.close()
+    timings.sort()
+    return {
+        'case': case.__name__, 'impl': impl, 'storage': storage, 'size': size, 'ops': count,
+        'seconds': elapsed, 'ops_per_s': count / elapsed, 'rows_per_s': count * rows_per_op / elapsed,
+        'p50_us': percentile(timings, 50) * 1e6, 'p99_us': percentile(timings, 99) * 1e6,
+        'peak_kib': peak / 1024.0
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        commit = None
+    return {
+        'commit': commit, 'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(), 'machine': platform.machine(), 'timestamp': time.time()
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='GenericDAO benchmarks against raw sqlite3.')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='table sizes (default %(default)s)')
+    parser.add_argument('--storage', default='memory,file', help='memory and/or file (default %(default)s)')
+    parser.add_argument('--ops', type=int, default=2000, help='operations of the per-row cases (default %(default)s)')
+    parser.add_argument('--cases', default=','.join(c.__name__ for c in CASES), help='cases to run (default all)')
+    parser.add_argument('--json', help='writes the results to this file (- for stdout)')
+    args = parser.parse_args(argv)
+    cases = [c for c in CASES if c.__name__ in args.cases.split(',')]
+    sizes = [int(s) for s in args.sizes.split(',')]
+    directory = tempfile.mkdtemp()
+    results = []
+    out = sys.stderr if args.json == '-' else sys.stdout
+    out.write('%-18s %-7s %8s %-7s %12s %12s %10s %10s %10s %7s\n' % (
+        'case', 'storage', 'size', 'impl', 'ops/s', 'rows/s', 'p50 us', 'p99 us', 'peak KiB', 'x raw'))
+    try:
+        for storage in args.storage.split(','):
+            for size in sizes:
+                for case in cases:
+                    raw = measure(case, 'sqlite3', storage, size, args.ops, directory)
+                    dao = measure(case, 'pydao', storage, size, args.ops, directory)
+                    # How many times slower than sqlite3.
+                    dao['overhead'] = raw['ops_per_s'] / dao['ops_per_s']
+                    for r in (raw, dao):
+                        out.write('%-18s %-7s %8d %-7s %12.0f %12.0f %10.1f %10.1f %10.1f %7s\n' % (
+                            r['case'], storage, size, r['impl'], r['ops_per_s'], r['rows_per_s'],
+                            r['p50_us'], r['p99_us'], r['peak_kib'],
+                            '%.2f' % r['overhead'] if 'overhead' in r else ''))
+                        out.flush()
+                    results.extend((raw, dao))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    if args.json:
+        report = {'environment': environment(), 'results': results}
+        if args.json == '-':
+            json.dump(report, sys.stdout, indent=2)
+        else:
+            with open(args.json, 'w') as f:
+                json.dump(report, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
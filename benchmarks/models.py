@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Memory and throughput of the Produto style models (properties over name mangled
+attributes in an instance __dict__) against the compact Model (__slots__) classes.
+
+Usage: python -m benchmarks.models [rows]
+'''
+
+import sys
+import time
+import tracemalloc
+
+from pydao.orm.dao import GenericDAO
+from pydao.orm.db import DriverManager
+from pydao.orm.models import Field, Model, Produto
+
+
+class ProdutoSlots(Model):
+    __table__ = 'produtos'
+    id = Field(int, primary_key=True)
+    nome = Field(str)
+    preco = Field(float)
+
+
+def produto(i):
+    p = Produto()
+    p.id = i
+    p.nome = 'Produto %d' % i
+    p.preco = float(i)
+    return p
+
+
+def produto_slots(i):
+    return ProdutoSlots(id=i, nome='Produto %d' % i, preco=float(i))
+
+
+def measure(label, function, rows):
+    tracemalloc.start()
+    start = time.perf_counter()
+    objs = function(rows)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('%-32s %10.0f objs/s %8.1f bytes/obj %10.1f KiB peak' % (
+        label, rows / elapsed, float(current) / rows, peak / 1024.0))
+    return objs
+
+
+def main(rows=100000):
+    conn = DriverManager.connection(dbms='sqlite', database=':memory:', auto_commit=True)
+    conn.cursor.execute('CREATE TABLE produtos (id INTEGER PRIMARY KEY, nome TEXT, preco REAL)')
+    GenericDAO(connection=conn, model=ProdutoSlots).insert_many(
+        [produto_slots(i) for i in range(rows)])
+    produtos = GenericDAO(connection=conn, model=Produto)
+    slots = GenericDAO(connection=conn, model=ProdutoSlots)
+
+    def hydrate_produto(rows):
+        # The current style: rows from select() copied to the objects one by one.
+        objs = []
+        for row in produtos.select():
+            p = Produto()
+            p.id, p.nome, p.preco = row
+            objs.append(p)
+        return objs
+
+    print('%d rows' % rows)
+    measure('build Produto', lambda n: [produto(i) for i in range(n)], rows)
+    measure('build ProdutoSlots', lambda n: [produto_slots(i) for i in range(n)], rows)
+    measure('select + Produto', hydrate_produto, rows)
+    measure('select_objects Produto', lambda n: produtos.select_objects(), rows)
+    measure('select_objects ProdutoSlots', lambda n: slots.select_objects(), rows)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:2]])
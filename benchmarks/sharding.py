@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+ShardedDAO on several file-backed SQLite databases: checks the keyed routing (integer and text keys) and the
+merged results against the same rows sorted in Python, then times the scatter-gather queries.
+
+Usage: python -m benchmarks.sharding [--shards 4] [--size 100000] [--ops 200]
+'''
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from pydao.orm.db import DriverManager
+from pydao.orm.models import Produto
+from pydao.orm.sharding import ShardedDAO
+
+SCHEMA = 'CREATE TABLE produtos (id TEXT PRIMARY KEY, nome TEXT, preco REAL)'
+
+
+def shards(directory, count):
+    conns = []
+    for i in range(count):
+        conn = DriverManager.connection(dbms='sqlite', database=os.path.join(directory, 'shard%d.db' % i),
+                                        auto_commit=True)
+        conn.reference.execute(SCHEMA)
+        conns.append(conn)
+    return conns
+
+
+def located(sd, key):
+    # Index of the shards that have the register.
+    return [i for i, dao in enumerate(sd.daos) if dao.select(where='id = ?', params=(key,))]
+
+
+def check(sd, size):
+    random.seed(1)
+    rows = [{'id': 'K-%d' % i, 'nome': 'Produto %d' % i, 'preco': None if i % 17 == 0 else random.randint(0, 9999)}
+            for i in range(size)]
+    assert sd.insert_many(rows) == size
+    assert sd.count() == size
+    assert sum(dao.query().count() for dao in sd.daos) == size
+    # Text key: it stays the one given and the next calls find the register in the shard of the key.
+    settings = {'id': 'K-77x', 'nome': 'Texto', 'preco': 1.0}
+    sd.insert(settings=settings)
+    assert settings['id'] == 'K-77x', settings
+    assert located(sd, 'K-77x') == [sd.shard('K-77x')]
+    p = Produto()
+    p.id = 'XYZ'
+    p.nome, p.preco = 'Objeto', 2.0
+    sd.insert(p)
+    assert p.id == 'XYZ' and located(sd, 'XYZ') == [sd.shard('XYZ')]
+    p.preco = 3.0
+    sd.update(p)
+    filled = Produto()
+    filled.id = 'XYZ'
+    sd.fill(filled)
+    assert filled.preco == 3.0
+    sd.delete(where=settings)
+    sd.delete(p)
+    assert located(sd, 'K-77x') == [] and located(sd, 'XYZ') == []
+    # Ordered merge with limit, NULLs first in ascending order (SQLite).
+    expected = sorted(rows, key=lambda r: (r['preco'] is not None, r['preco'] or 0, r['id']))
+    got = sd.select(fields=['id'], order_by=['preco', 'id'], limit=50)
+    assert [r[0] for r in got] == [r['id'] for r in expected[:50]]
+    expected = sorted(rows, key=lambda r: (r['preco'] is None, -(r['preco'] or 0), r['id']))
+    got = sd.select(fields=['id'], order_by=['-preco', 'id'], limit=50)
+    assert [r[0] for r in got] == [r['id'] for r in expected[:50]]
+
+
+def timed(operation, ops):
+    start = time.perf_counter()
+    for i in range(ops):
+        operation(i)
+    return ops / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='ShardedDAO checks and scatter-gather timings on SQLite files.')
+    parser.add_argument('--shards', type=int, default=4, help='number of shards (default %(default)s)')
+    parser.add_argument('--size', type=int, default=100000, help='registers (default %(default)s)')
+    parser.add_argument('--ops', type=int, default=200, help='operations per case (default %(default)s)')
+    args = parser.parse_args(argv)
+    directory = tempfile.mkdtemp()
+    try:
+        conns = shards(directory, args.shards)
+        with ShardedDAO(conns, Produto) as sd:
+            check(sd, args.size)
+            print('checks ok (%d shards, %d registers)' % (args.shards, args.size))
+            cases = (
+                ('fill', lambda i: sd.fill(dic={'id': 'K-%d' % (i % args.size)})),
+                ('count', lambda i: sd.count(where='preco < ?', params=(5000,))),
+                ('top_50', lambda i: sd.select(order_by=['-preco', 'id'], limit=50)),
+            )
+            for name, operation in cases:
+                print('%-8s %10.0f ops/s' % (name, timed(operation, args.ops)))
+        for conn in conns:
+            conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Created on 28/03/2014
+
+@author: thiago-amm
+'''
+
+__author__ = 'Thiago Alexandre Martins Monteiro'
+__date__ = '24/11/2012'
+
+import asyncio
+import concurrent.futures
+import functools
+
+from pydao.orm.dao import GenericDAO
+
+
+class AsyncGenericDAO(object):
+    '''
+    Class:       AsyncGenericDAO
+    Module:      pydao.async_dao
+    Description: asyncio front-end of GenericDAO. The methods are coroutines that run the blocking DB-API
+                 calls on a bounded pool of threads, each call with a connection taken from a ConnectionPool,
+                 so many queries can be in flight without blocking the event loop.
+                 Each call is commited when it returns. NOTE: like GenericDAO, the methods print the database
+                 errors and return instead of raising them, so the work done by a call before an error is
+                 commited too; only the exceptions that leave GenericDAO (connection errors...) roll it back.
+    '''
+
+    def __init__(self, pool=None, model=None, max_workers=None):
+        '''
+        Method:          __init__
+        Description:     Constructor that initializes objects of this class.
+                         NOTE: it is a magic method.
+        Parameters:
+            self:        The current object reference.
+            pool:        A ConnectionPool (see DriverManager.pool).
+            model:       The model class.
+            max_workers: The number of threads (default None - the maximum size of the pool).
+        Return:          none.
+        Usage:           adao = AsyncGenericDAO(pool=DriverManager.pool(dbms='sqlite', database='pydao.db'),
+                                                model=Produto)
+                         rows = await adao.select(where='preco < 20')
+        '''
+        self.__pool = pool
+        self.__model = model
+        if not max_workers:
+            max_workers = pool.stats()['max_size']
+        self.__executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='pydao'
+        )
+
+    @property
+    def pool(self):
+        '''
+        Property:    pool
+        Description: Returns the connection pool used by this object.
+        Parameters:
+            self:    The current object reference.
+        Return:      A ConnectionPool.
+        Usage:       pool = adao.pool
+        '''
+        return self.__pool
+
+    @property
+    def model(self):
+        '''
+        Property:    model
+        Description: Returns the model class used by this object.
+        Parameters:
+            self:    The current object reference.
+        Return:      A class.
+        Usage:       model = adao.model
+        '''
+        return self.__model
+
+    def __call(self, method, *args, **kwargs):
+        # Runs on a worker thread: checkout, GenericDAO call, commit (rollback when it raises) and checkin.
+        with self.__pool.connection() as conn:
+            dao = GenericDAO(connection=conn, model=self.__model)
+            return getattr(dao, method)(*args, **kwargs)
+
+    def __run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(
+            self.__executor, functools.partial(self.__call, method, *args, **kwargs)
+        )
+
+    async def select(self, fields=[], where='', params=()):
+        '''
+        Method:      select
+        Description: Coroutine version of GenericDAO.select.
+        Usage:       rows = await adao.select(where='id < ?', params=(3,))
+        '''
+        return await self.__run('select', fields=fields, where=where, params=params)
+
+    async def select_objects(self, fields=[], where='', params=()):
+        '''
+        Method:      select_objects
+        Description: Coroutine version of GenericDAO.select_objects.
+        Usage:       produtos = await adao.select_objects(where='preco < 20')
+        '''
+        return await self.__run('select_objects', fields=fields, where=where, params=params)
+
+    async def insert(self, obj=None, settings={}):
+        '''
+        Method:      insert
+        Description: Coroutine version of GenericDAO.insert.
+        Usage:       await adao.insert(p)
+        '''
+        return await self.__run('insert', obj=obj, settings=settings)
+
+    async def insert_many(self, objs=[], batch_size=1000):
+        '''
+        Method:      insert_many
+        Description: Coroutine version of GenericDAO.insert_many.
+        Usage:       count = await adao.insert_many([p1, p2])
+        '''
+        return await self.__run('insert_many', objs=objs, batch_size=batch_size)
+
+    async def update(self, obj=None, settings={}, where={}):
+        '''
+        Method:      update
+        Description: Coroutine version of GenericDAO.update.
+        Usage:       await adao.update(p)
+        '''
+        return await self.__run('update', obj=obj, settings=settings, where=where)
+
+    async def delete(self, obj=None, where={}):
+        '''
+        Method:      delete
+        Description: Coroutine version of GenericDAO.delete.
+        Usage:       await adao.delete(p)
+        '''
+        return await self.__run('delete', obj=obj, where=where)
+
+    async def fill(self, obj=None, dic={}):
+        '''
+        Method:      fill
+        Description: Coroutine version of GenericDAO.fill.
+        Usage:       await adao.fill(p)
+        '''
+        return await self.__run('fill', obj=obj, dic=dic)
+
+    def close(self):
+        '''
+        Method:      close
+        Description: Waits for the running calls and stops the threads, the pool is not closed.
+                     NOTE: it blocks, inside a coroutine use aclose.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       adao.close()
+        '''
+        self.__executor.shutdown(wait=True)
+
+    async def aclose(self):
+        '''
+        Method:      aclose
+        Description: Coroutine version of close: waits for the running calls and stops the threads without
+                     blocking the event loop, the pool is not closed.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       await adao.aclose()
+        '''
+        # The wait runs on a thread of the default executor of the loop, not on the threads being stopped.
+        await asyncio.get_running_loop().run_in_executor(None, self.__executor.shutdown)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+        return False
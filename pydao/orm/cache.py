@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Created on 28/03/2014
+
+@author: thiago-amm
+'''
+
+__author__ = 'Thiago Alexandre Martins Monteiro'
+__date__ = '24/11/2012'
+
+import collections
+import threading
+import time
+
+
+class LRUCache(object):
+    '''
+    Class:       LRUCache
+    Module:      pydao.cache
+    Description: Local (process memory) cache backend with a bounded number of entries. When full the least
+                 recently used entry is evicted, entries also expire after their time to live.
+                 NOTE: Other backends (for a cache shared between processes) must implement the methods
+                 get, set, delete and clear with the same signatures.
+    '''
+
+    def __init__(self, max_size=1000):
+        '''
+        Method:       __init__
+        Description:  Constructor that initializes objects of this class.
+                      NOTE: it is a magic method.
+        Parameters:
+            self:     The current object reference.
+            max_size: The maximum number of entries (default 1000).
+        Return:       none.
+        Usage:        backend = LRUCache(max_size=10000)
+        '''
+        self.__max_size = max_size
+        # key => (value, expires)
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        self.__evictions = 0
+        self.__expirations = 0
+
+    def get(self, key):
+        '''
+        Method:      get
+        Description: Returns the value of a key or None if it is not in the cache or expired.
+        Parameters:
+            self:    The current object reference.
+            key:     A hashable key.
+        Return:      The value or None.
+        Usage:       value = backend.get(key)
+        '''
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.time():
+                del self.__entries[key]
+                self.__expirations += 1
+                return None
+            self.__entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        '''
+        Method:      set
+        Description: Stores the value of a key.
+        Parameters:
+            self:    The current object reference.
+            key:     A hashable key.
+            value:   The value.
+            ttl:     Seconds until the entry expires (default None - never).
+        Return:      none.
+        Usage:       backend.set(key, value, ttl=60)
+        '''
+        expires = time.time() + ttl if ttl is not None else None
+        with self.__lock:
+            self.__entries[key] = (value, expires)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__max_size:
+                self.__entries.popitem(last=False)
+                self.__evictions += 1
+
+    def delete(self, key):
+        '''
+        Method:      delete
+        Description: Removes a key from the cache.
+        Parameters:
+            self:    The current object reference.
+            key:     A hashable key.
+        Return:      none.
+        Usage:       backend.delete(key)
+        '''
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self):
+        '''
+        Method:      clear
+        Description: Removes all the entries.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       backend.clear()
+        '''
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(self):
+        '''
+        Method:      stats
+        Description: Returns the number of entries, evictions and expirations.
+        Parameters:
+            self:    The current object reference.
+        Return:      A dictionary - {}.
+        Usage:       print(backend.stats())
+        '''
+        with self.__lock:
+            return {
+                'size': len(self.__entries),
+                'max_size': self.__max_size,
+                'evictions': self.__evictions,
+                'expirations': self.__expirations,
+            }
+
+
+class EntityCache(object):
+    '''
+    Class:       EntityCache
+    Module:      pydao.cache
+    Description: Read-through cache of the rows read by primary key through GenericDAO (fill and
+                 select(where='id = ...')). The entries of a model are invalidated when this process inserts,
+                 updates or deletes registers of the model.
+    Usage:       GenericDAO.cache = EntityCache(backend=LRUCache(max_size=10000), ttl=300, ttls={Produto: 30})
+    '''
+
+    def __init__(self, backend=None, ttl=300, ttls=None):
+        '''
+        Method:      __init__
+        Description: Constructor that initializes objects of this class.
+                     NOTE: it is a magic method.
+        Parameters:
+            self:    The current object reference.
+            backend: The cache backend (default None - a LRUCache with 1000 entries).
+            ttl:     Seconds that a row stays in the cache (default 300, None - until evicted).
+            ttls:    A dictionary with the time to live of specific model classes (default None).
+        Return:      none.
+        Usage:       cache = EntityCache(ttl=60)
+        '''
+        self.__backend = backend if backend is not None else LRUCache()
+        self.__ttl = ttl
+        self.__ttls = dict(ttls or {})
+        # Invalidating a model moves it to a new generation, the old entries are never read again.
+        self.__generations = {}
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__invalidations = 0
+
+    @property
+    def backend(self):
+        '''
+        Property:    backend
+        Description: Returns the cache backend.
+        Parameters:
+            self:    The current object reference.
+        Return:      The backend (a LRUCache by default).
+        Usage:       backend = cache.backend
+        '''
+        return self.__backend
+
+    def __model(self, dao):
+        conn = dao.connection
+        return (conn.dbms, conn.host, conn.port, conn.database, dao.model_name)
+
+    def __key(self, dao, id):
+        model = self.__model(dao)
+        return model + (self.__generations.get(model, 0), str(id))
+
+    def get(self, dao, id):
+        '''
+        Method:      get
+        Description: Returns the rows cached for a primary key or None.
+        Parameters:
+            self:    The current object reference.
+            dao:     The GenericDAO of the model.
+            id:      The primary key value.
+        Return:      A list of rows or None.
+        Usage:       rows = cache.get(gd, 1)
+        '''
+        rows = self.__backend.get(self.__key(dao, id))
+        with self.__lock:
+            if rows is None:
+                self.__misses += 1
+            else:
+                self.__hits += 1
+        return rows
+
+    def set(self, dao, id, rows):
+        '''
+        Method:      set
+        Description: Stores the rows read for a primary key.
+        Parameters:
+            self:    The current object reference.
+            dao:     The GenericDAO of the model.
+            id:      The primary key value.
+            rows:    The list of rows.
+        Return:      none.
+        Usage:       cache.set(gd, 1, rows)
+        '''
+        ttl = self.__ttls.get(dao.model_class, self.__ttl)
+        self.__backend.set(self.__key(dao, id), rows, ttl)
+
+    def invalidate(self, dao, id=None):
+        '''
+        Method:      invalidate
+        Description: Removes the row of a primary key from the cache, or all the rows of the model.
+        Parameters:
+            self:    The current object reference.
+            dao:     The GenericDAO of the model.
+            id:      The primary key value (default None - all the rows of the model).
+        Return:      none.
+        Usage:       cache.invalidate(gd, 1)
+        '''
+        with self.__lock:
+            self.__invalidations += 1
+            if id is None:
+                model = self.__model(dao)
+                self.__generations[model] = self.__generations.get(model, 0) + 1
+                return
+        self.__backend.delete(self.__key(dao, id))
+
+    def clear(self):
+        '''
+        Method:      clear
+        Description: Removes all the entries of the cache.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       cache.clear()
+        '''
+        self.__backend.clear()
+
+    def stats(self):
+        '''
+        Method:      stats
+        Description: Returns the hits, misses and invalidations of the cache plus the statistics of the
+                     backend (evictions, expirations and size for LRUCache).
+        Parameters:
+            self:    The current object reference.
+        Return:      A dictionary - {}.
+        Usage:       print(cache.stats()['hits'])
+        '''
+        with self.__lock:
+            stats = {
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'invalidations': self.__invalidations,
+            }
+        if hasattr(self.__backend, 'stats'):
+            stats.update(self.__backend.stats())
+        return stats
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Created on 28/03/2014
+
+@author: thiago-amm
+'''
+
+__author__ = 'Thiago Alexandre Martins Monteiro'
+__date__ = '24/11/2012'
+
+import datetime
+import decimal
+
+try:
+    import numpy
+except ImportError:
+    # NumPy is only needed by the columnar reads (GenericDAO.select_columns).
+    numpy = None
+
+# How DECIMAL (NUMERIC) values are stored in the arrays.
+FLOAT = 'float'  # float64
+FIXED = 'fixed'  # int64 with the value multiplied by 10 ** scale
+
+
+class Column(object):
+    '''
+    Class:       Column
+    Module:      pydao.columns
+    Description: Typed NumPy array of a result column, filled chunk by chunk. The array is preallocated and
+                 doubles its capacity when full, the type is taken from the metadata of the model or from the
+                 first value that is not NULL. The NULLs are kept in a mask allocated on the first NULL.
+    '''
+
+    def __init__(self, name, type=None, decimal=FLOAT, scale=2, capacity=1024, is_decimal=False):
+        '''
+        Method:         __init__
+        Description:    Constructor that initializes objects of this class.
+                        NOTE: it is a magic method.
+        Parameters:
+            self:       The current object reference.
+            name:       The column name.
+            type:       The Python type of the column (default None - taken from the first value).
+            decimal:    FLOAT or FIXED, how the DECIMAL values are stored (default FLOAT).
+            scale:      The number of decimal places kept by FIXED (default 2).
+            capacity:   The initial number of rows of the array (default 1024).
+            is_decimal: Store the column as DECIMAL (see decimal) even when the driver returns float or int
+                        values (default False - only Decimal values).
+        Return:         none.
+        Usage:          col = Column('preco', decimal=FIXED, scale=2, is_decimal=True)
+        '''
+        if numpy is None:
+            raise ImportError('NumPy is required by the columnar reads (pip install numpy)')
+        self.__name = name
+        self.__decimal = decimal
+        self.__scale = scale
+        self.__capacity = max(1, capacity)
+        self.__size = 0
+        self.__data = None
+        self.__mask = None
+        self.__dtype = None
+        self.__fill = None
+        self.__convert = None
+        self.__is_decimal = is_decimal
+        if type is not None:
+            self.__resolve(type)
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def size(self):
+        return self.__size
+
+    def __resolve(self, type):
+        # Chooses the dtype, the value stored in place of the NULLs and the conversion of the values.
+        if issubclass(type, bool):
+            self.__dtype, self.__fill = numpy.bool_, False
+        elif self.__is_decimal and issubclass(type, (int, float)):
+            if self.__decimal == FIXED:
+                factor = 10 ** self.__scale
+                self.__dtype, self.__fill = numpy.int64, 0
+                self.__convert = lambda v: int(round(v * factor)) if v is not None else 0
+            else:
+                self.__dtype, self.__fill = numpy.float64, numpy.nan
+        elif issubclass(type, int):
+            self.__dtype, self.__fill = numpy.int64, 0
+        elif issubclass(type, float):
+            self.__dtype, self.__fill = numpy.float64, numpy.nan
+        elif issubclass(type, decimal.Decimal):
+            if self.__decimal == FIXED:
+                factor = decimal.Decimal(10) ** self.__scale
+                self.__dtype, self.__fill = numpy.int64, 0
+                self.__convert = lambda v: int((v * factor).to_integral_value()) if v is not None else 0
+            else:
+                self.__dtype, self.__fill = numpy.float64, numpy.nan
+        elif issubclass(type, datetime.datetime):
+            self.__dtype, self.__fill = 'datetime64[us]', None
+        elif issubclass(type, datetime.date):
+            self.__dtype, self.__fill = 'datetime64[D]', None
+        else:
+            self.__dtype, self.__fill = object, None
+
+    def __reserve(self, size):
+        # Grows the arrays (doubling their capacity) to hold size rows.
+        capacity = self.__capacity
+        while capacity < size:
+            capacity *= 2
+        if self.__data is None:
+            self.__data = numpy.empty(capacity, dtype=self.__dtype)
+        elif capacity > len(self.__data):
+            data = numpy.empty(capacity, dtype=self.__dtype)
+            data[:self.__size] = self.__data[:self.__size]
+            self.__data = data
+            if self.__mask is not None:
+                mask = numpy.zeros(capacity, dtype=numpy.bool_)
+                mask[:self.__size] = self.__mask[:self.__size]
+                self.__mask = mask
+        self.__capacity = capacity
+
+    def __null(self, start, stop):
+        # Marks the rows from start to stop as NULL.
+        if self.__mask is None:
+            self.__mask = numpy.zeros(self.__capacity, dtype=numpy.bool_)
+        self.__mask[start:stop] = True
+
+    def extend(self, values):
+        '''
+        Method:      extend
+        Description: Appends the values of a chunk of rows.
+        Parameters:
+            self:    The current object reference.
+            values:  A sequence with the values of the column, None for NULL.
+        Return:      none.
+        Usage:       col.extend((1.5, None, 2.0))
+        '''
+        count = len(values)
+        if not count:
+            return
+        start = self.__size
+        if self.__dtype is None:
+            first = next((v for v in values if v is not None), None)
+            if first is None:
+                # Only NULLs so far, the type is not known yet.
+                self.__size += count
+                return
+            self.__resolve(type(first))
+            # The rows before this chunk were NULL.
+            self.__reserve(start + count)
+            if start:
+                self.__data[:start] = self.__fill
+                self.__null(0, start)
+        else:
+            self.__reserve(start + count)
+        if None in values:
+            if self.__mask is None:
+                self.__mask = numpy.zeros(self.__capacity, dtype=numpy.bool_)
+            self.__mask[start:start + count] = numpy.fromiter(
+                (v is None for v in values), dtype=numpy.bool_, count=count)
+            if self.__convert is None:
+                fill = self.__fill
+                values = [fill if v is None else v for v in values]
+        if self.__convert is not None:
+            values = list(map(self.__convert, values))
+        self.__data[start:start + count] = values
+        self.__size = start + count
+
+    def array(self):
+        '''
+        Method:      array
+        Description: Returns the values appended so far.
+        Parameters:
+            self:    The current object reference.
+        Return:      A numpy.ndarray or, when there are NULLs, a numpy.ma.MaskedArray.
+        Usage:       prices = col.array()
+        '''
+        if self.__dtype is None:
+            # The column had only NULLs.
+            return numpy.ma.masked_all(self.__size, dtype=object)
+        data = self.__data[:self.__size] if self.__data is not None else numpy.empty(0, self.__dtype)
+        if self.__mask is not None and self.__mask[:self.__size].any():
+            return numpy.ma.MaskedArray(data, mask=self.__mask[:self.__size].copy())
+        return data
+
+
+def columns(cursor, types=None, decimal=FLOAT, scale=2, chunk_size=10000, decimals=()):
+    '''
+    Function:       columns
+    Description:    Reads the rows of a cursor that returns tuples, chunk by chunk, into one typed array per
+                    column, without creating an object per row.
+    Parameters:
+        cursor:     A cursor (that returns tuples) after the execute.
+        types:      A dictionary with the Python type of the columns (default None - taken from the values).
+        decimal:    FLOAT or FIXED, how the DECIMAL values are stored (default FLOAT). It applies to the
+                    columns whose values are Decimal and to the ones in decimals, the other float columns are
+                    float64 whatever it is.
+        scale:      The number of decimal places kept by FIXED (default 2).
+        chunk_size: The number of rows fetched at a time (default 10000).
+        decimals:   The names of the columns stored as DECIMAL even when the driver returns float or int
+                    values (default () - only the columns with Decimal values).
+    Return:         A dictionary (column name => numpy.ndarray or numpy.ma.MaskedArray), in the order of the columns.
+    Usage:          cursor.execute('SELECT id, preco FROM produtos')
+                    arrays = columns(cursor, decimal=FIXED)
+    '''
+    types = types or {}
+    rows = cursor.fetchmany(chunk_size)
+    # Read after the first fetch: the named cursors of PostgreSQL have no description before it.
+    names = [d[0] for d in cursor.description]
+    decimals = set(decimals)
+    # Oracle returns the column names in uppercase.
+    result = [Column(n, types.get(n), decimal, scale, chunk_size, n in decimals or n.lower() in decimals)
+              for n in names]
+    while rows:
+        # Transposes the chunk, one tuple of values per column.
+        for column, values in zip(result, zip(*rows)):
+            column.extend(values)
+        rows = cursor.fetchmany(chunk_size)
+    return dict((c.name, c.array()) for c in result)
@@ -10,6 +10,13 @@ Created on 28/03/2014
 __author__ = 'Thiago Alexandre Martins Monteiro'
 __date__ = '24/11/2012'
 
+import re
+
+from pydao.orm import columns, export
+from pydao.orm.db import ConnectionProvider, RowCursor, row_converter
+from pydao.orm.metadata import metadata
+from pydao.orm.query import Query
+
 
 class GenericDAO(object):
     '''
@@ -19,6 +26,15 @@ class GenericDAO(object):
                  isolating the persistence layer from the business layer of the application.
     '''
 
+    # SQL statements compiled by model class, DBMS, operation and column set.
+    # It is shared by every instance of this class.
+    __statements = {}
+    __statements_max = 1024
+
+    # Optional cache of the rows read by primary key, shared by every instance of this class.
+    # Usage: GenericDAO.cache = EntityCache(ttl=60) (see the pydao.orm.cache module).
+    cache = None
+
     def __init__(self, connection=None, model=None, dic={}, **entries):
         '''
         Method:      __init__
@@ -28,17 +44,18 @@ class GenericDAO(object):
         Return:      none.
         Usage:       gd = GenericDAO(connection=conn, model=Product)
         '''
-        # None
-        self.__model = model
-        if model:
-            self.__model = model()
+        # The model instance is only created when the model property is used, the
+        # table name and the columns come from the metadata shared by the model class.
+        self.__model_class = model
+        self.__model = None
+        self.__metadata = metadata(model) if model else None
 #        if dic and dic.keys():
 #            # Create an model class (class Model(object) ) in the project
 #            self.__model.__dict__.update(dic)
 #        if entries and entries.keys():
 #            self.__model.__dict__.update(entries)
         self.update_model_name()
-        self.__connection = connection
+        self.connection = connection
 
     @property
     def connection(self):
@@ -48,10 +65,13 @@ class GenericDAO(object):
         Parameters:
             self:    The current object reference.
         Return:      A reference to the database connection used by this object.
+                     NOTE: with a ConnectionProvider (like ThreadLocalConnection) it is resolved on every use.
         Usage:       conn = gd.connection
                      NOTE: See the description of the constructor (method __init__) of this class above to
                      understand what the gd variable is.
         '''
+        if self.__provided:
+            return self.__connection.current
         return self.__connection
 
     @connection.setter
@@ -67,6 +87,21 @@ class GenericDAO(object):
                      to understand what it does.
         '''
         self.__connection = connection
+        self.__provided = isinstance(connection, ConnectionProvider)
+
+    def reading(self):
+        '''
+        Method:      reading
+        Description: Returns a context manager with the connection used by the reads of this object (select,
+                     select_objects, fill, the queries...): the connection itself or, with a ConnectionProvider
+                     (like RoutingConnection), the one it chooses for a read.
+        Parameters:
+            self:    The current object reference.
+        Return:      A context manager.
+        Usage:       with gd.reading() as conn:
+                         ...
+        '''
+        return self.__connection.reading()
 
     @property
     def model(self):
@@ -80,6 +115,8 @@ class GenericDAO(object):
                      NOTE: See the description of the constructor (method __init__) of this class above to
                      understand what the gd variable is.
         '''
+        if self.__model is None and self.__model_class:
+            self.__model = self.__model_class()
         return self.__model
 
     @model.setter
@@ -94,9 +131,35 @@ class GenericDAO(object):
                      NOTE: See the description of the constructor (method __init__) of this class above to
                      understand what the gd variable is.
         '''
-        self.__model = model()
+        self.__model_class = model
+        self.__model = None
+        self.__metadata = metadata(model) if model else None
         self.update_model_name()
 
+    @property
+    def model_class(self):
+        '''
+        Property:    model_class
+        Description: Returns the model class used by this object.
+        Parameters:
+            self:    The current object reference.
+        Return:      A class.
+        Usage:       cls = gd.model_class
+        '''
+        return self.__model_class
+
+    @property
+    def metadata(self):
+        '''
+        Property:    metadata
+        Description: Returns the metadata (table name, columns, primary key and types) of the model class.
+        Parameters:
+            self:    The current object reference.
+        Return:      A ModelMetadata (see the pydao.orm.metadata module).
+        Usage:       columns = gd.metadata.columns
+        '''
+        return self.__metadata
+
     @property
     def model_name(self):
         '''
@@ -137,23 +200,8 @@ class GenericDAO(object):
                      NOTE: See the description of the constructor (method __init__) of this class above to
                      understand what the gd variable is.
         '''
-        if self.model:
-            uppers = list(filter(str.isupper, self.__model.__class__.__name__))
-            if len(uppers) == 1:
-                self.__model_name = '%ss' % self.__model.__class__.__name__.lower()
-            elif len(uppers) > 1:
-                name = list(self.__model.__class__.__name__)
-                name_aux = name[:]
-                offset = 0
-                for i, c in enumerate(name_aux):
-                    if i > 0 and c in uppers:
-                        name.insert(i + offset, 's_')
-                        offset += 1
-                name.append('s')
-                name = ''.join(name)
-                self.__model_name = name.lower()
-            else:
-                pass
+        if self.__metadata:
+            self.__model_name = self.__metadata.table
         else:
             self.__model_name = None
 
@@ -176,50 +224,382 @@ class GenericDAO(object):
                 # Create a instance of the model class.
                 self.__model = module()
             except Exception as e:
-                print(e.message)
+                print(e)
 
-    def select(self, fields=[], where=''):
+    def select(self, fields=[], where='', params=()):
         '''
         Method:         select
         Description:    Returns a set of rows from a table with represents a model class.
         Parameters:
             self:       The current object reference.
             fields:     A list (default a empty list - []).
-            conditions: A string (default a empty string - '').
-        Return:         A list - [].
-        Usage:          gd.select(fields=['name', 'price'], where='id < 3 and price = 20')
+            where:      A string (default a empty string - ''), use the placeholder of the driver
+                        (see Connection.placeholder) for the values passed in params.
+            params:     A tuple with the values bound to the where string (default a empty tuple - ()).
+        Return:         A list - [] with the rows in the shape of the row factory of the connection
+                        (see Connection.row_factory).
+        Usage:          gd.select(fields=['name', 'price'], where='id < 3 and price = 20') or
+                        gd.select(where='price = ?', params=(20,))
                         NOTE: See the description of the constructor (method __init__) of this class above to
                         understand what the gd variable is.
         '''
-        if self.connection.reference and self.model:
-            cursor = self.connection.cursor
-            sql = 'SELECT %s FROM '
-            if fields and (type(fields) == type([])):
-                attrs = ''
-                for f in fields:
-                    attrs += '%s, ' % f
-                # Remove the blank space and the comma of the end.
-                attrs = attrs[:-2]
-                sql = sql % attrs
+        if self.connection.reference and self.__model_class:
+            cache = GenericDAO.cache
+            id = None
+            if cache is not None and not fields:
+                id = self.__cached_id(where, params)
+                if id is not None:
+                    cached = cache.get(self, id)
+                    if cached is not None:
+                        return self.__convert(*cached)
+            # The rows are fetched as tuples and converted once to the shape asked.
+            sql = self.__select_sql(fields, where)
+            try:
+                columns, rows = self.__fetch(sql, params)
+            except Exception as e:
+                print(e)
+                return []
+            if id is not None and rows:
+                cache.set(self, id, (columns, rows))
+            return self.__convert(columns, rows)
+        else:
+            return None
+
+    def __cached_id(self, where, params):
+        # Returns the primary key of a select by primary key (pk = ? or pk = 'value'), the only
+        # selects read from the cache, or None.
+        pk = self.__metadata.primary_key
+        if not isinstance(where, str):
+            return None
+        if params:
+            if len(params) == 1 and \
+                    where.replace(' ', '') == '%s=%s' % (pk, self.connection.placeholder(0)):
+                return params[0]
+            return None
+        match = re.match(r"^\s*%s\s*=\s*'?([^'\s]+)'?\s*$" % re.escape(pk), where)
+        return match.group(1) if match else None
+
+    def __convert(self, columns, rows):
+        # Converts tuple rows to the shape of the row factory of the connection.
+        convert = row_converter(self.connection.row_factory, columns)
+        if convert is None:
+            return list(rows)
+        return list(map(convert, rows))
+
+    def invalidate(self, id=None):
+        '''
+        Method:      invalidate
+        Description: Removes a register (or all the registers) of the model from the cache (see the cache
+                     attribute) and tells the ConnectionProvider that the connection was written (see
+                     ConnectionProvider.written), it is called by insert, update and delete.
+        Parameters:
+            self:    The current object reference.
+            id:      The primary key value (default None - all the registers of the model).
+        Return:      none.
+        Usage:       gd.invalidate(1)
+        '''
+        if GenericDAO.cache is not None:
+            GenericDAO.cache.invalidate(self, id)
+        if self.__provided:
+            self.__connection.written()
+
+    def query(self):
+        '''
+        Method:      query
+        Description: Returns a lazy and composable query over the table of the model (see the Query class
+                     of the pydao.orm.query module).
+        Parameters:
+            self:    The current object reference.
+        Return:      A Query.
+        Usage:       gd.query().filter(preco__lt=20).order_by('-id').limit(50)
+        '''
+        return Query(self)
+
+    def select_objects(self, fields=[], where='', params=()):
+        '''
+        Method:         select_objects
+        Description:    Returns the rows of a select (see the select method) as objects of the model class,
+                        created straight from the rows without intermediate dictionaries.
+        Parameters:
+            self:       The current object reference.
+            fields:     A list (default a empty list - []).
+            where:      A string (default a empty string - '').
+            params:     A tuple with the values bound to the where string (default a empty tuple - ()).
+        Return:         A list of objects - [].
+        Usage:          for p in gd.select_objects(where='preco < 20'):
+                            print(p.nome)
+        '''
+        if not (self.connection.reference and self.__model_class):
+            return None
+        sql = self.__select_sql(fields, where)
+        try:
+            columns, rows = self.__fetch(sql, params)
+        except Exception as e:
+            print(e)
+            return []
+        return list(map(self.__metadata.hydrator(columns), rows))
+
+    def select_page(self, fields=[], where='', params=(), after=None, order_by='id', limit=100):
+        '''
+        Method:         select_page
+        Description:    Returns a page of rows using keyset (seek) pagination: instead of skipping OFFSET rows the
+                        query starts right after the key of the last row of the previous page, so every page
+                        costs the same no matter how deep it is. The NULLs of the order columns are placed as the
+                        DBMS sorts them: first in ascending order on MySQL and SQLite, last on PostgreSQL and Oracle.
+        Parameters:
+            self:       The current object reference.
+            fields:     A list (default a empty list - []), the order_by columns are added when missing.
+            where:      A string (default a empty string - '').
+            params:     A tuple with the values bound to the where string (default a empty tuple - ()).
+            after:      The continuation token returned with the previous page (default None - first page).
+            order_by:   A column name or a list of column names, prefixed with - for descending order
+                        (default 'id'). The columns must identify the rows uniquely (add the primary key).
+            limit:      The number of rows of the page (default 100).
+        Return:         A tuple (rows, token) where token is None after the last page. With one order column the
+                        token is its value, or (None,) when it is NULL.
+        Usage:          rows, token = gd.select_page(order_by='id', limit=50)
+                        while token is not None:
+                            rows, token = gd.select_page(after=token, order_by='id', limit=50)
+        '''
+        if not (self.connection.reference and self.__model_class):
+            return None, None
+        conn = self.connection
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        order = tuple((c[1:], True) if c.startswith('-') else (c, False) for c in order_by)
+        if fields and isinstance(fields, (list, tuple)):
+            fields = tuple(fields) + tuple(c for c, desc in order if c not in fields)
+        else:
+            fields = ()
+        if after is not None and len(order) == 1 and not isinstance(after, tuple):
+            after = (after,)
+        if not (where and isinstance(where, str)):
+            where = ''
+        # The token values that are NULL, compared with IS NULL instead of a parameter.
+        nulls = tuple(v is None for v in after) if after is not None else None
+        # NULLs sort before the values in ascending order on MySQL and SQLite, after them on the others.
+        nulls_low = conn.dbms.lower() in ('mysql', 'sqlite')
+        sql = self.__statement('select_page', fields, (where, order, nulls, len(params)))
+        if sql is None:
+            marks = iter(range(len(params), conn.max_parameters))
+            conditions = []
+            if where:
+                conditions.append('(%s)' % where)
+            if after is not None:
+                # (a, b) > (x, y) written as a > x OR (a = x AND b > y), Oracle has no row value comparison.
+                seek = []
+                for i, (column, desc) in enumerate(order):
+                    if nulls[i] and nulls_low == desc:
+                        # Nothing comes after a NULL sorted after the values.
+                        continue
+                    terms = ['%s IS NULL' % c if nulls[j] else '%s = %s' % (c, conn.placeholder(next(marks)))
+                             for j, (c, d) in enumerate(order[:i])]
+                    if nulls[i]:
+                        terms.append('%s IS NOT NULL' % column)
+                    else:
+                        term = '%s %s %s' % (column, '<' if desc else '>', conn.placeholder(next(marks)))
+                        if nulls_low == desc:
+                            # The NULLs come after the values.
+                            term = '(%s OR %s IS NULL)' % (term, column)
+                        terms.append(term)
+                    seek.append('(%s)' % ' AND '.join(terms))
+                conditions.append('(%s)' % ' OR '.join(seek) if seek else '1 = 0')
+            sql = 'SELECT %s FROM %s' % (', '.join(fields) or '*', self.__model_name)
+            if conditions:
+                sql = '%s WHERE %s' % (sql, ' AND '.join(conditions))
+            sql = '%s ORDER BY %s' % (sql, ', '.join(
+                '%s DESC' % c if desc else c for c, desc in order))
+            if conn.dbms.lower() == 'oracle':
+                sql = '%s FETCH FIRST %s ROWS ONLY' % (sql, conn.placeholder(next(marks)))
             else:
-                sql = sql % '*'
+                sql = '%s LIMIT %s' % (sql, conn.placeholder(next(marks)))
+            sql = self.__statement('select_page', fields, (where, order, nulls, len(params)), sql)
+        values = list(params)
+        if after is not None:
+            for i, (column, desc) in enumerate(order):
+                if not (nulls[i] and nulls_low == desc):
+                    values.extend(v for v in after[:i + 1] if v is not None)
+        # One row more than the page tells whether there is a next page.
+        values.append(limit + 1)
+        try:
+            columns, rows = self.__fetch(sql, values)
+        except Exception as e:
+            print(e)
+            return [], None
+        if len(rows) <= limit:
+            return self.__convert(columns, rows), None
+        rows = rows[:limit]
+        last = rows[-1]
+        token = tuple(last[columns.index(c)] for c, desc in order)
+        return self.__convert(columns, rows), token[0] if len(token) == 1 and token[0] is not None else token
+
+    def __fetch(self, sql, params=(), conn=None):
+        # Runs a query and returns the column names and all its rows (tuples), closing the cursor.
+        # Without conn it runs on the connection for reads (see the reading method).
+        if conn is None:
+            with self.reading() as conn:
+                return self.__fetch(sql, params, conn)
+        with conn.open_cursor(tuples=True) as cursor:
+            self.__execute(cursor, sql, params)
+            return self.__columns(cursor), cursor.fetchall()
+
+    def __columns(self, cursor):
+        # Column names of the last query, Oracle returns them in uppercase.
+        meta = self.__metadata
+        return tuple(d[0] if meta.has_column(d[0]) else d[0].lower() for d in cursor.description)
+
+    def iter_select(self, fields=[], where='', params=(), chunk_size=1000):
+        '''
+        Method:         iter_select
+        Description:    Returns the rows of a select (see the select method) one by one, fetching chunk_size
+                        rows at a time from a server-side cursor (SSCursor on MySQL, named cursors on
+                        PostgreSQL), so the memory used does not depend on the size of the result.
+        Parameters:
+            self:       The current object reference.
+            fields:     A list (default a empty list - []).
+            where:      A string (default a empty string - '').
+            params:     A tuple with the values bound to the where string (default a empty tuple - ()).
+            chunk_size: The number of rows fetched from the database at a time (default 1000).
+        Return:         A generator of rows.
+        Usage:          for row in gd.iter_select(where='price > 20', chunk_size=500):
+                            print(row)
+                        NOTE: On MySQL, read all the rows (or close the generator) before running other
+                        statements on the same connection.
+        '''
+        if not (self.connection.reference and self.__model_class):
+            return
+        sql = self.__select_sql(fields, where)
+        with self.reading() as conn:
+            cursor = conn.server_cursor()
+            try:
+                cursor.arraysize = chunk_size
+                try:
+                    self.__execute(cursor, sql, params)
+                except Exception as e:
+                    print(e)
+                    return
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield row
+            finally:
+                cursor.close()
+
+    def select_columns(self, fields=[], where='', params=(), decimal=columns.FLOAT, scale=2, chunk_size=10000,
+                       decimals=()):
+        '''
+        Method:         select_columns
+        Description:    Returns the result of a select (see the select method) in columns: one typed NumPy array per
+                        column, filled chunk by chunk from a server-side cursor without creating an object per row.
+                        The columns with NULLs are returned as masked arrays (numpy.ma.MaskedArray).
+                        NOTE: it requires NumPy.
+        Parameters:
+            self:       The current object reference.
+            fields:     A list (default a empty list - []).
+            where:      A string (default a empty string - '').
+            params:     A tuple with the values bound to the where string (default a empty tuple - ()).
+            decimal:    How the DECIMAL values are stored: columns.FLOAT (float64) or columns.FIXED (int64 with
+                        the value multiplied by 10 ** scale) (default columns.FLOAT).
+            scale:      The number of decimal places kept by columns.FIXED (default 2).
+            chunk_size: The number of rows fetched from the database at a time (default 10000).
+            decimals:   The names of the columns stored as DECIMAL even when the driver returns float or int
+                        values, as SQLite does (default () - only the columns with Decimal values).
+        Return:         A dictionary (column name => array) - {}.
+        Usage:          arrays = gd.select_columns(fields=['id', 'preco'], decimal=columns.FIXED, decimals=['preco'])
+                        total = arrays['preco'].sum()
+        '''
+        if not (self.connection.reference and self.__model_class):
+            return None
+        sql = self.__select_sql(fields, where)
+        with self.reading() as conn:
+            cursor = conn.server_cursor()
+            if isinstance(cursor, RowCursor):
+                cursor = cursor.cursor
+            try:
+                cursor.arraysize = chunk_size
+                try:
+                    self.__execute(cursor, sql, params)
+                except Exception as e:
+                    print(e)
+                    return {}
+                arrays = columns.columns(cursor, self.__metadata.types, decimal, scale, chunk_size, decimals)
+            finally:
+                cursor.close()
+        # Oracle returns the column names in uppercase.
+        meta = self.__metadata
+        return dict((c if meta.has_column(c) else c.lower(), a) for c, a in arrays.items())
+
+    def export(self, target=None, format=export.CSV, where='', params=(), fields=[], chunk_size=10000,
+               compress=None, progress=None):
+        '''
+        Method:         export
+        Description:    Writes the result of a select (see the select method) to a file as CSV (with a header line)
+                        or JSON Lines, streaming the rows chunk by chunk from a server-side cursor to a buffered
+                        writer, so the memory used does not depend on the size of the table.
+                        Decimal values are written in fixed-point notation, dates and times in ISO 8601 and the
+                        NULLs as empty CSV fields or JSON null (see pydao.orm.export.text).
+        Parameters:
+            self:       The current object reference.
+            target:     A path or a file object (text, or binary with compression).
+            format:     'csv' or 'jsonl' (default 'csv').
+            where:      A string (default a empty string - '').
+            params:     A tuple with the values bound to the where string (default a empty tuple - ()).
+            fields:     A list (default a empty list - [] - all the columns).
+            chunk_size: The number of rows fetched from the database at a time (default 10000).
+            compress:   Compress with gzip (default None - when the path ends with .gz).
+            progress:   A function called after each chunk with the number of rows written and the seconds
+                        elapsed (default None).
+        Return:         A dictionary with the rows written, the seconds and the rows per second (rows, seconds and
+                        rows_per_s), or None on errors.
+        Usage:          stats = gd.export('produtos.jsonl.gz', format='jsonl', where='preco > ?', params=(20,))
+                        print('%(rows)d rows, %(rows_per_s).0f rows/s' % stats)
+        '''
+        if not (self.connection.reference and self.__model_class):
+            return None
+        sql = self.__select_sql(fields, where)
+        try:
+            if format not in (export.CSV, export.JSONL):
+                raise ValueError('Unknown export format: %s' % format)
+            output = export.Output(target, compress)
+        except Exception as e:
+            print(e)
+            return None
+        try:
+            with self.reading() as conn:
+                cursor = conn.server_cursor()
+                if isinstance(cursor, RowCursor):
+                    cursor = cursor.cursor
+                try:
+                    cursor.arraysize = chunk_size
+                    self.__execute(cursor, sql, params)
+                    return export.write(cursor, output.stream, format, self.__columns, chunk_size, progress)
+                finally:
+                    cursor.close()
+        except Exception as e:
+            print(e)
+            return None
+        finally:
+            output.close()
+
+    def __select_sql(self, fields, where):
+        if not (fields and isinstance(fields, (list, tuple))):
+            fields = ()
+        if not (where and isinstance(where, str)):
+            where = ''
+        sql = self.__statement('select', tuple(fields), where)
+        if sql is None:
             # Add the table name in the SQL statement
             # obeying the rules for naming tables.
             # To wit:
             # The entity name in plural and lowercase.
             # Ex: product (Product model class) entity => products table.
-            sql = '%s %s' % (sql, self.model_name)
-
-            if where and (type(where) == type('')):
+            sql = 'SELECT %s FROM %s' % (', '.join(fields) or '*', self.model_name)
+            if where:
                 sql = '%s WHERE %s' % (sql, where)
-            # print sql
-            try:
-                cursor.execute(sql)
-            except Exception as e:
-                print(e.message)
-            return cursor.fetchall()
-        else:
-            return None
+            sql = self.__statement('select', tuple(fields), where, sql)
+        return sql
 
     def insert(self, obj=None, settings={}):
         '''
@@ -236,56 +616,308 @@ class GenericDAO(object):
                       NOTE: See the description of the constructor (method __init__) of this class above to
                       understand what the gd variable is.
         '''
-        if self.connection.reference and self.model:
-            cursor = self.connection.cursor
-            sql = 'INSERT INTO %s' % self.__model_name
-            if obj and isinstance(obj, self.model.__class__):
-                fields = ''
-                for f in obj.__dict__.keys():
-                    f = f.replace('_%s__' % obj.__class__.__name__, '')
-                    if not (self.connection.auto_increment and f == 'id'):
-                        fields += '%s, ' % f
-                # Remove the blank space and comma of the end.
-                fields = '(%s)' % fields[:-2]
-                # print fields
-                values = ''
-                for attr, val in obj.__dict__.items():
-                    attr = attr.replace('_%s__' % obj.__class__.__name__, '')
-                    if self.connection.auto_increment and attr == 'id':
-                        pass
-                    else:
-                        values += "'%s', " % val
-                values = '(%s)' % values[:-2]
-                if fields and values:
-                    sql = "%s %s VALUES %s" % (sql, fields, values)
-            # Receive a dictionary with the data to be registered.
+        if self.connection.reference and self.__model_class:
+            if obj and isinstance(obj, self.__model_class):
+                row = self.__row(obj)
             else:
-                dic = settings
-                if self.check_dict(dic):
-                    settings = ''
-                    fields = ''
-                    for f in dic.keys():
-                        fields += '%s, ' % f
-                    fields = fields[:-2]
-                    values = ''
-                    for v in dic.values():
-                        values += "'%s', " % v
-                    values = values[:-2]
-                    sql = '%s (%s) VALUES (%s)' % (sql, fields, values)
-            # print sql
+                # Receive a dictionary with the data to be registered.
+                obj = None
+                row = self.__row(settings)
+            if row is None:
+                return
+            fields, values = row
             try:
-                cursor.execute(sql)
+                with self.connection.open_cursor(tuples=True) as cursor:
+                    id = self.__insert_row(cursor, fields, values)
+                self.invalidate(id)
                 if obj:
-                    obj.id = self.last_id()
-                if settings:
-                    settings['id'] = self.last_id()
+                    setattr(obj, self.__metadata.primary_key, id)
+                    self.__metadata.snapshot(obj)
+                else:
+                    settings[self.__metadata.primary_key] = id
             except Exception as e:
-                print(e.message)
+                print(e)
+
+    def __insert_sql(self, fields):
+        # INSERT of one register returning the generated key in the same statement:
+        # RETURNING on PostgreSQL and RETURNING INTO an output variable on Oracle,
+        # MySQL and SQLite give it in cursor.lastrowid. A key given in fields is not generated.
+        sql = self.__statement('insert', fields)
+        if sql is None:
+            conn = self.connection
+            pk = self.__metadata.primary_key
+            marks = ', '.join(conn.placeholder(i) for i in range(len(fields)))
+            sql = 'INSERT INTO %s (%s) VALUES (%s)' % (self.__model_name, ', '.join(fields), marks)
+            dbms = conn.dbms.lower()
+            if pk in fields:
+                pass
+            elif dbms == 'postgresql':
+                sql = '%s RETURNING %s' % (sql, pk)
+            elif dbms == 'oracle':
+                sql = '%s RETURNING %s INTO %s' % (sql, pk, conn.placeholder(len(fields)))
+            sql = self.__statement('insert', fields, sql=sql)
+        return sql
+
+    def __insert_row(self, cursor, fields, values):
+        # Inserts one register and returns its primary key without another query,
+        # the key given by the caller when it is in fields.
+        sql = self.__insert_sql(fields)
+        pk = self.__metadata.primary_key
+        if pk in fields:
+            self.__execute(cursor, sql, values)
+            return values[list(fields).index(pk)]
+        dbms = self.connection.dbms.lower()
+        if dbms == 'postgresql':
+            self.__execute(cursor, sql, values)
+            return cursor.fetchone()[0]
+        elif dbms == 'oracle':
+            key = cursor.var(self.connection.driver.NUMBER)
+            self.__execute(cursor, sql, tuple(values) + (key,))
+            return self.__oracle_key(key.getvalue())
+        self.__execute(cursor, sql, values)
+        return cursor.lastrowid
+
+    def __oracle_key(self, value):
+        # cx_Oracle >= 6 returns the DML returning values as a list.
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return value
+
+    def insert_many(self, objs=[], batch_size=1000):
+        '''
+        Method:         insert_many
+        Description:    Inserts many registers in the table that represents the model class using multi-row
+                        INSERT statements (one transaction per batch) instead of one statement per register.
+                        The generated ids are assigned back to the objects or dictionaries when the DBMS allows
+                        it: INSERT ... RETURNING (PostgreSQL, SQLite >= 3.35) or the consecutive ids after
+                        the first lastrowid (MySQL, it requires innodb_autoinc_lock_mode 0 or 1).
+        Parameters:
+            self:       The current object reference.
+            objs:       A list of objects and/or dictionaries (default a empty list - []).
+            batch_size: The maximum number of registers inserted by statement (default 1000), it is reduced
+                        to respect the limit of bound parameters of the driver.
+        Return:         The number of registers inserted - int.
+        Usage:          gd.insert_many([p1, p2, {'nome': 'Ipod', 'preco': '150'}], batch_size=500)
+                        NOTE: See the description of the constructor (method __init__) of this class above to
+                        understand what the gd variable is.
+        '''
+        count = 0
+        if not (self.connection.reference and self.__model_class):
+            return count
+        # Group the registers by column set keeping the order in which they were given.
+        groups = []
+        for item in objs:
+            row = self.__row(item)
+            if row is None:
+                continue
+            fields, values = row
+            if groups and groups[-1][0] == fields:
+                groups[-1][1].append((item, values))
+            else:
+                groups.append((fields, [(item, values)]))
+        for fields, rows in groups:
+            size = max(1, min(batch_size, self.connection.max_parameters // max(1, len(fields))))
+            for start in range(0, len(rows), size):
+                batch = rows[start:start + size]
+                try:
+                    with self.connection.transaction(), \
+                            self.connection.open_cursor(tuples=True) as cursor:
+                        self.__insert_batch(cursor, fields, batch)
+                except Exception as e:
+                    print(e)
+                    return count
+                finally:
+                    self.invalidate()
+                count += len(batch)
+        return count
+
+    def __row(self, item, key=False):
+        # Returns the column names and the values of an object or dictionary to be inserted,
+        # with key the primary key is kept when it is set (even with auto increment).
+        meta = self.__metadata
+        if isinstance(item, self.__model_class):
+            values = meta.values(item)
+            if meta.has_column(meta.primary_key):
+                pk = meta.columns.index(meta.primary_key)
+                # The key is left to the database when it generates it (auto increment or not set).
+                if (self.connection.auto_increment and not key) or values[pk] is None:
+                    return (meta.columns[:pk] + meta.columns[pk + 1:],
+                            values[:pk] + values[pk + 1:])
+            return meta.columns, values
+        if self.check_dict(item):
+            return tuple(item.keys()), tuple(item.values())
+        return None
+
+    def upsert_many(self, rows=[], conflict_on=['id'], update_fields=None, batch_size=1000):
+        '''
+        Method:            upsert_many
+        Description:       Inserts many registers updating the ones that already exist (insert or update) in
+                           batches, each batch is one statement (one transaction per batch):
+                           INSERT ... ON DUPLICATE KEY UPDATE (MySQL), INSERT ... ON CONFLICT DO UPDATE
+                           (PostgreSQL, SQLite >= 3.24) and MERGE (Oracle, sent with executemany).
+        Parameters:
+            self:          The current object reference.
+            rows:          A list of objects and/or dictionaries (default a empty list - []).
+            conflict_on:   The columns of the primary key or unique constraint that identify the existing
+                           registers (default ['id']), MySQL uses the keys of the table instead.
+            update_fields: The columns updated in the existing registers (default None - all the columns given
+                           except the conflict_on ones), an empty list only inserts the new registers.
+            batch_size:    The maximum number of registers by statement (default 1000), it is reduced to
+                           respect the limit of bound parameters of the driver.
+        Return:            The number of registers sent - int.
+        Usage:             gd.upsert_many(produtos, conflict_on=['id'], update_fields=['preco'])
+                           NOTE: See the description of the constructor (method __init__) of this class above to
+                           understand what the gd variable is.
+        '''
+        count = 0
+        if not (self.connection.reference and self.__model_class):
+            return count
+        conflict_on = tuple(conflict_on)
+        groups = []
+        for item in rows:
+            row = self.__row(item, key=self.__metadata.primary_key in conflict_on)
+            if row is None:
+                continue
+            fields, values = row
+            if groups and groups[-1][0] == fields:
+                groups[-1][1].append(values)
+            else:
+                groups.append((fields, [values]))
+        try:
+            for fields, values in groups:
+                missing = [c for c in conflict_on if c not in fields]
+                if missing:
+                    raise ValueError('upsert_many: missing conflict_on columns: %s' % ', '.join(missing))
+                if update_fields is None:
+                    updates = tuple(f for f in fields if f not in conflict_on)
+                else:
+                    updates = tuple(f for f in update_fields if f in fields and f not in conflict_on)
+                size = max(1, min(batch_size, self.connection.max_parameters // max(1, len(fields))))
+                for start in range(0, len(values), size):
+                    batch = values[start:start + size]
+                    with self.connection.transaction(), \
+                            self.connection.open_cursor(tuples=True) as cursor:
+                        self.__upsert_batch(cursor, fields, batch, conflict_on, updates)
+                    count += len(batch)
+        except Exception as e:
+            print(e)
+        finally:
+            self.invalidate()
+        return count
+
+    def __upsert_batch(self, cursor, fields, batch, conflict_on, updates):
+        conn = self.connection
+        dbms = conn.dbms.lower()
+        extra = (conflict_on, updates)
+        if dbms == 'oracle':
+            # MERGE of one register sent for the whole batch at once.
+            sql = self.__statement('upsert', fields, extra)
+            if sql is None:
+                source = ', '.join('%s %s' % (conn.placeholder(i), f) for i, f in enumerate(fields))
+                sql = 'MERGE INTO %s t USING (SELECT %s FROM dual) s ON (%s)' % (
+                    self.__model_name, source, ' AND '.join('t.%s = s.%s' % (c, c) for c in conflict_on))
+                if updates:
+                    sql = '%s WHEN MATCHED THEN UPDATE SET %s' % (
+                        sql, ', '.join('t.%s = s.%s' % (f, f) for f in updates))
+                sql = '%s WHEN NOT MATCHED THEN INSERT (%s) VALUES (%s)' % (
+                    sql, ', '.join(fields), ', '.join('s.%s' % f for f in fields))
+                sql = self.__statement('upsert', fields, extra, sql)
+            cursor.executemany(sql, [tuple(values) for values in batch])
+            return
+        # One statement cannot affect a register twice (ON CONFLICT DO UPDATE), the last values of each
+        # conflict_on key are the ones kept.
+        index = [fields.index(c) for c in conflict_on]
+        unique = {}
+        for values in batch:
+            key = tuple(values[i] for i in index)
+            unique.pop(key, None)
+            unique[key] = values
+        batch = list(unique.values())
+        sql = self.__statement('upsert', fields, (len(batch),) + extra)
+        if sql is None:
+            marks = []
+            for n in range(len(batch)):
+                offset = n * len(fields)
+                marks.append('(%s)' % ', '.join(
+                    conn.placeholder(offset + i) for i in range(len(fields))))
+            sql = 'INSERT INTO %s (%s) VALUES %s' % (self.__model_name, ', '.join(fields), ', '.join(marks))
+            if dbms == 'mysql':
+                # Without columns to update the key is set to itself, which changes nothing.
+                sql = '%s ON DUPLICATE KEY UPDATE %s' % (sql, ', '.join(
+                    '%s = VALUES(%s)' % (f, f) for f in updates or conflict_on[:1]))
+            elif updates:
+                sql = '%s ON CONFLICT (%s) DO UPDATE SET %s' % (sql, ', '.join(conflict_on), ', '.join(
+                    '%s = excluded.%s' % (f, f) for f in updates))
+            else:
+                sql = '%s ON CONFLICT (%s) DO NOTHING' % (sql, ', '.join(conflict_on))
+            sql = self.__statement('upsert', fields, (len(batch),) + extra, sql)
+        params = []
+        for values in batch:
+            params.extend(values)
+        cursor.execute(sql, params)
+
+    def __insert_batch(self, cursor, fields, batch):
+        conn = self.connection
+        columns = ', '.join(fields)
+        pk = self.__metadata.primary_key
+        generated = pk not in fields
+        if conn.dbms.lower() == 'oracle':
+            # Oracle has no multi-row VALUES, the driver sends the whole batch at once
+            # and returns the key of each register in an array variable.
+            sql = self.__insert_sql(fields)
+            if not generated:
+                cursor.executemany(sql, [tuple(values) for item, values in batch])
+                return
+            key = cursor.var(conn.driver.NUMBER, arraysize=len(batch))
+            cursor.executemany(sql, [tuple(values) + (key,) for item, values in batch])
+            ids = [self.__oracle_key(key.getvalue(i)) for i in range(len(batch))]
+            self.__assign_ids(batch, ids)
+            return
+        returning = generated and conn.supports_returning
+        sql = self.__statement('insert_many', fields, (len(batch), returning))
+        if sql is None:
+            marks = []
+            for n in range(len(batch)):
+                offset = n * len(fields)
+                marks.append('(%s)' % ', '.join(
+                    conn.placeholder(offset + i) for i in range(len(fields))))
+            sql = 'INSERT INTO %s (%s) VALUES %s' % (self.__model_name, columns, ', '.join(marks))
+            if returning:
+                sql = '%s RETURNING %s' % (sql, pk)
+            sql = self.__statement('insert_many', fields, (len(batch), returning), sql)
+        params = []
+        for item, values in batch:
+            params.extend(values)
+        ids = None
+        if returning:
+            cursor.execute(sql, params)
+            ids = sorted(r[0] for r in cursor.fetchall())
+        else:
+            cursor.execute(sql, params)
+            if generated and conn.dbms.lower() == 'mysql' and cursor.lastrowid:
+                # MySQL returns the id of the first register of a multi-row INSERT.
+                ids = [cursor.lastrowid + i for i in range(len(batch))]
+        self.__assign_ids(batch, ids)
+
+    def __assign_ids(self, batch, ids):
+        pk = self.__metadata.primary_key
+        if ids and len(ids) == len(batch):
+            for (item, values), id in zip(batch, ids):
+                if isinstance(item, dict):
+                    item[pk] = id
+                else:
+                    setattr(item, pk, id)
+                    self.__metadata.snapshot(item)
 
     def update(self, obj=None, settings={}, where={}):
         '''
         Method:       update
         Description:  Updates a register in a table on the database that represents the model object used by this object.
+                      Objects loaded through this class (select_objects, fill, insert...) only send the columns
+                      changed since then and no statement at all when nothing changed, other objects send all
+                      the columns that are not None.
         Parameters:
             self:     The reference to this object.
             obj:      The object representing the register that will be updated (default None).
@@ -297,46 +929,208 @@ class GenericDAO(object):
                       NOTE: See the description of the constructor (method __init__) of this class above to
                       understand what the gd variable is.
         '''
-        if self.connection.reference and self.model:
-            cursor = self.connection.cursor
-            sql = 'UPDATE %s SET' % self.__model_name
+        if self.connection.reference and self.__model_class:
             # Receive a object.
-            if obj and isinstance(obj, self.model.__class__):
-                settings = ''
-                for attr, val in obj.__dict__.items():
-                    attr = attr.replace('_%s__' % obj.__class__.__name__, '')
-                    if attr != 'id' and val:
-                        settings += "%s = '%s', " % (attr, val)
-                # Remove the blank space and comma of the settings end.
-                settings = settings[:-2]
-                sql = "%s %s WHERE id = '%s'" % (sql, settings, obj.id)
-            # Receive two dictionaries (
-            # Receber dois dicionarios (one with the settings and the other with conditions).
+            if obj and isinstance(obj, self.__model_class):
+                meta = self.__metadata
+                fields = self.__dirty(obj)
+                if not fields:
+                    return
+                current = dict(zip(meta.columns, meta.values(obj)))
+                values = [current[f] for f in fields]
+                conditions = (meta.primary_key,)
+                values.append(getattr(obj, meta.primary_key))
+            # Receive two dictionaries (one with the settings and the other with conditions).
             else:
-                dic = settings
-                if self.check_dict(dic):
-                    settings = ''
-                    for k, v in dic.items():
+                obj = None
+                fields, conditions, values = (), (), []
+                if self.check_dict(settings):
+                    fields = tuple(settings.keys())
+                    for v in settings.values():
                         if v in [[], {}, None]:
-                            settings += "%s = 'NULL'" % k
-                        elif v == False:
-                            settings += "%s = '0', " % k
+                            values.append(None)
+                        elif v is False:
+                            values.append(0)
                         else:
-                            settings += "%s = '%s', " % (k, v)
-                    settings = settings[:-2]
-                    sql = '%s %s' % (sql, settings)
-                dic = where
-                if self.check_dict(dic):
-                    where = ''
-                    for k, v in dic.items():
-                        where += "%s = '%s' AND " % (k, v)
-                    where = where[:-4]
-                    sql = '%s WHERE %s' % (sql, where)
-            # print sql
+                            values.append(v)
+                if self.check_dict(where):
+                    conditions = tuple(where.keys())
+                    values.extend(where.values())
+            if not fields:
+                return
+            sql = self.__update_sql(fields, conditions)
+            try:
+                with self.connection.open_cursor(tuples=True) as cursor:
+                    self.__execute(cursor, sql, values)
+                if obj is not None:
+                    self.__metadata.snapshot(obj)
+            except Exception as e:
+                print(e)
+            finally:
+                self.invalidate(values[-1] if conditions == (self.__metadata.primary_key,) else None)
+
+    def __dirty(self, obj):
+        # Columns of an object to be updated: the ones changed since it was loaded or, when it was
+        # not loaded through a DAO, the ones that are not None. The primary key is never updated.
+        meta = self.__metadata
+        fields = meta.changes(obj)
+        if fields is None:
+            fields = tuple(c for c, v in zip(meta.columns, meta.values(obj)) if v is not None)
+        return tuple(f for f in fields if f != meta.primary_key)
+
+    def __update_sql(self, fields, conditions):
+        sql = self.__statement('update', fields, conditions)
+        if sql is None:
+            marks = iter(range(len(fields) + len(conditions)))
+            settings = ', '.join(
+                '%s = %s' % (f, self.connection.placeholder(next(marks))) for f in fields)
+            sql = 'UPDATE %s SET %s' % (self.__model_name, settings)
+            if conditions:
+                sql = '%s WHERE %s' % (sql, ' AND '.join(
+                    '%s = %s' % (f, self.connection.placeholder(next(marks))) for f in conditions))
+            sql = self.__statement('update', fields, conditions, sql)
+        return sql
+
+    def update_many(self, objs=[], fields=None, batch_size=1000):
+        '''
+        Method:         update_many
+        Description:    Updates many objects (see the update method) by chunks of batch_size objects, one
+                        transaction per chunk. The objects with the same columns to update are sent together:
+                        in one UPDATE ... SET f = CASE id WHEN ... END WHERE id IN (...) per chunk on MySQL and
+                        PostgreSQL (one round trip) and in one executemany per chunk on SQLite and Oracle.
+                        If a chunk fails the error is printed and the following chunks are not sent.
+        Parameters:
+            self:       The current object reference.
+            objs:       A list of objects of the model class (default a empty list - []).
+            fields:     The columns to update in every object (default None - the dirty columns of each
+                        object, objects without changes are skipped).
+            batch_size: The maximum number of objects by chunk (default 1000), it is reduced to respect the
+                        limit of bound parameters of the driver.
+        Return:         The number of registers updated - int.
+        Usage:          for p in produtos:
+                            p.preco = p.preco * 1.1
+                        gd.update_many(produtos, fields=['preco'])
+        '''
+        count = 0
+        if not (self.connection.reference and self.__model_class):
+            return count
+        conn = self.connection
+        meta = self.__metadata
+        pk = meta.primary_key
+        if fields is not None:
+            fields = tuple(f for f in fields if f != pk and meta.has_column(f))
+            if not fields:
+                return count
+        # columns to update => objects, in the order in which they were given
+        groups = {}
+        for obj in objs:
+            if isinstance(obj, self.__model_class):
+                columns = fields if fields is not None else self.__dirty(obj)
+                if columns:
+                    groups.setdefault(columns, []).append(obj)
+        case = conn.dbms.lower() in ('mysql', 'postgresql')
+        for columns, group in groups.items():
+            index = [meta.columns.index(f) for f in columns]
+            size = batch_size
+            if case:
+                size = min(size, conn.max_parameters // (2 * len(columns) + 1))
+            size = max(1, size)
+            for start in range(0, len(group), size):
+                chunk = group[start:start + size]
+                rows = []
+                for obj in chunk:
+                    values = meta.values(obj)
+                    rows.append((getattr(obj, pk), tuple(values[i] for i in index)))
+                try:
+                    with conn.transaction(), conn.open_cursor(tuples=True) as cursor:
+                        if case:
+                            self.__update_case(cursor, columns, rows)
+                        else:
+                            cursor.executemany(self.__update_sql(columns, (pk,)),
+                                               [values + (id,) for id, values in rows])
+                        count += cursor.rowcount if cursor.rowcount >= 0 else len(chunk)
+                    for obj in chunk:
+                        meta.snapshot(obj)
+                except Exception as e:
+                    print(e)
+                    return count
+                finally:
+                    for id, values in rows:
+                        self.invalidate(id)
+        return count
+
+    def __update_case(self, cursor, columns, rows):
+        # UPDATE t SET f = CASE id WHEN ? THEN ? ... ELSE f END, ... WHERE id IN (...), one statement per chunk.
+        # ELSE f never runs (every id of the IN list has its WHEN) but types the CASE as the column: PostgreSQL
+        # types a CASE of untyped values (NULL, quoted literals) as text, which numeric columns do not accept.
+        conn = self.connection
+        pk = self.__metadata.primary_key
+        sql = self.__statement('update_many', columns, len(rows))
+        if sql is None:
+            marks = iter(range(conn.max_parameters))
+            settings = []
+            for f in columns:
+                settings.append('%s = CASE %s %s ELSE %s END' % (f, pk, ' '.join(
+                    'WHEN %s THEN %s' % (conn.placeholder(next(marks)), conn.placeholder(next(marks)))
+                    for row in rows), f))
+            sql = 'UPDATE %s SET %s WHERE %s IN (%s)' % (self.__model_name, ', '.join(settings), pk, ', '.join(
+                conn.placeholder(next(marks)) for row in rows))
+            sql = self.__statement('update_many', columns, len(rows), sql)
+        params = []
+        for i in range(len(columns)):
+            for id, values in rows:
+                params.append(id)
+                params.append(values[i])
+        params.extend(id for id, values in rows)
+        cursor.execute(sql, params)
+
+    def delete_many(self, objs=[], batch_size=1000):
+        '''
+        Method:         delete_many
+        Description:    Deletes many registers by primary key with DELETE ... WHERE id IN (...) statements of
+                        batch_size keys at most, one transaction per statement. If a statement fails the error
+                        is printed and the following ones are not sent.
+        Parameters:
+            self:       The current object reference.
+            objs:       A list of objects, dictionaries and/or primary key values (default a empty list - []).
+            batch_size: The maximum number of registers by statement (default 1000), it is reduced to
+                        respect the limit of bound parameters of the driver.
+        Return:         The number of registers deleted - int.
+        Usage:          gd.delete_many([p1, {'id': 2}, 3])
+        '''
+        count = 0
+        if not (self.connection.reference and self.__model_class):
+            return count
+        conn = self.connection
+        meta = self.__metadata
+        pk = meta.primary_key
+        ids = []
+        for item in objs:
+            if isinstance(item, self.__model_class):
+                item = getattr(item, pk)
+            elif isinstance(item, dict):
+                item = item.get(pk)
+            if item is not None:
+                ids.append(item)
+        size = max(1, min(batch_size, conn.max_in_list))
+        for start in range(0, len(ids), size):
+            chunk = ids[start:start + size]
+            sql = self.__statement('delete_many', (pk,), len(chunk))
+            if sql is None:
+                sql = 'DELETE FROM %s WHERE %s IN (%s)' % (self.__model_name, pk, ', '.join(
+                    conn.placeholder(i) for i in range(len(chunk))))
+                sql = self.__statement('delete_many', (pk,), len(chunk), sql)
             try:
-                cursor.execute(sql)
+                with conn.transaction(), conn.open_cursor(tuples=True) as cursor:
+                    self.__execute(cursor, sql, chunk)
+                    count += cursor.rowcount if cursor.rowcount >= 0 else len(chunk)
             except Exception as e:
-                print(e.message)
+                print(e)
+                return count
+            finally:
+                for id in chunk:
+                    self.invalidate(id)
+        return count
 
     def delete(self, obj=None, where={}):
         '''
@@ -349,37 +1143,64 @@ class GenericDAO(object):
                      NOTE: See the description of the constructor (method __init__) of this class above to
                      understand what the gd variable is.
         '''
-        if self.connection.reference and self.model:
-            cursor = self.connection.cursor
-            sql = 'DELETE FROM %s WHERE' % self.__model_name
-            if obj and isinstance(obj, self.model.__class__):
-                sql = "%s id = '%s'" % (sql, obj.id)
+        if self.connection.reference and self.__model_class:
+            if obj and isinstance(obj, self.__model_class):
+                pk = self.__metadata.primary_key
+                conditions, values = (pk,), (getattr(obj, pk),)
+            # Check if the dictionary passed is valid to the associated model.
+            elif self.check_dict(where):
+                conditions, values = tuple(where.keys()), tuple(where.values())
             else:
-                # Check if the dictionary passed is valid to the associated model.
-                if self.check_dict(where):
-                    conditions = ''
-                    for f, v in where.items():
-                        conditions += "%s = '%s' AND " % (f, v)
-                    conditions = conditions[:-4]
-                    sql = '%s %s' % (sql, conditions)
-            # print sql
+                return
+            sql = self.__statement('delete', conditions)
+            if sql is None:
+                sql = 'DELETE FROM %s WHERE %s' % (self.__model_name, ' AND '.join(
+                    '%s = %s' % (f, self.connection.placeholder(i)) for i, f in enumerate(conditions)))
+                sql = self.__statement('delete', conditions, sql=sql)
             try:
-                cursor.execute(sql)
+                with self.connection.open_cursor(tuples=True) as cursor:
+                    self.__execute(cursor, sql, values)
             except Exception as e:
-                print(e.message)
+                print(e)
+            finally:
+                self.invalidate(values[0] if conditions == (self.__metadata.primary_key,) else None)
+
+    def __statement(self, operation, columns, extra=None, sql=None):
+        # Returns the SQL text compiled before for the model, DBMS, operation and column set,
+        # when sql is given it is stored. The same text is sent every time so the DBMS (and
+        # drivers with a statement cache, like sqlite3) can reuse the prepared statement.
+        key = (self.__model_class, self.__model_name, self.connection.dbms,
+               operation, columns, extra)
+        if sql is None:
+            return GenericDAO.__statements.get(key)
+        if len(GenericDAO.__statements) >= GenericDAO.__statements_max:
+            GenericDAO.__statements.clear()
+        GenericDAO.__statements[key] = sql
+        return sql
+
+    def __execute(self, cursor, sql, params=()):
+        # Without parameters the SQL is sent as is, so % characters in it are not
+        # interpreted by the format paramstyle of MySQLdb and psycopg2.
+        if params:
+            cursor.execute(sql, tuple(params))
+        else:
+            cursor.execute(sql)
+        return cursor
 
     def last_id(self):
         '''
         Method:      last_id
         Description: Returns the value of the id column from the last register inserted in the table 
                      that represents the object model used by this object.
+                     NOTE: insert and insert_many take the generated keys from the INSERT itself, this
+                     method runs a new query and may see registers inserted by other connections.
         Parameters:
             self:    The reference to this object.
         Return:      A integer value - int
         Usage:       gd.last_id()
         '''
         id = None
-        if self.connection.reference and self.model:
+        if self.connection.reference and self.__model_class:
             sql = ''
             if self.connection.dbms.lower() == 'mysql' or \
                     self.connection.dbms.lower() == 'postgresql' or \
@@ -394,15 +1215,11 @@ class GenericDAO(object):
                 pass
             # print sql
             try:
-                cursor = self.connection.cursor
-                cursor.execute(sql)
-                dbms = self.connection.dbms.lower()
-                if dbms in ['mysql', 'postgresql']:
-                    id = cursor.fetchone()['id']
-                elif dbms in ['oracle', 'sqlite']:
-                    id = cursor.fetchone()[0]
+                # On the primary connection, where the registers were inserted.
+                columns, rows = self.__fetch(sql, (), self.connection)
+                id = rows[0][0]
             except Exception as e:
-                print(e.message)
+                print(e)
         return id
 
     def check_dict(self, dic):
@@ -418,13 +1235,13 @@ class GenericDAO(object):
                      NOTE: See the description of the constructor (method __init__) of this class above to
                      understand what the gd variable is.
         '''
-        if self.model:
+        if self.__metadata:
             # Check if a dictionary was passed with something.
-            if dic and (type(dic) == type({})):
+            if dic and isinstance(dic, dict):
                 for k in dic.keys():
                     # Show the key that not matchs with the model class attribute.
                     # print k
-                    if not self.model.__dict__.has_key('_%s__%s' % (self.model.__class__.__name__, k)):
+                    if not self.__metadata.has_column(k):
                         return False
             else:
                 return False
@@ -448,19 +1265,88 @@ class GenericDAO(object):
         '''
         if not self.connection.reference:
             return
-        if obj and isinstance(obj, self.model.__class__):
-            # Returns a dictionary matching with a tuple on the table.
-            dic = self.select(where="id = '%s'" % obj.id)[0]
-            # Copy the values of dictionary above to the object.
-            for k, v in dic.items():
-                k = '_%s__%s' % (self.model.__class__.__name__, k)
-                obj.__dict__[k] = v
+        pk = self.__metadata.primary_key
+        if obj and isinstance(obj, self.__model_class):
+            # Copy the values of the register to the object.
+            self.__metadata.assign(obj, self.__register(getattr(obj, pk)))
+            self.__metadata.snapshot(obj)
         else:
             if self.check_dict(dic):
-                reg = self.select(where="id = '%s'" % dic['id'])[0]
-                # Copy the values of a dictionary to other.
-                for k, v in reg.items():
-                    dic[k] = v
+                # Copy the values of the register to the dictionary.
+                dic.update(self.__register(dic[pk]))
+
+    def __register(self, id):
+        # Returns a dictionary (column name => value) with the register of the primary key,
+        # whatever the row factory of the connection is.
+        pk = self.__metadata.primary_key
+        cached = GenericDAO.cache.get(self, id) if GenericDAO.cache is not None else None
+        if cached is None:
+            cached = self.__fetch(self.__select_sql((), '%s = %s' % (pk, self.connection.placeholder(0))), (id,))
+            if GenericDAO.cache is not None and cached[1]:
+                GenericDAO.cache.set(self, id, cached)
+        columns, rows = cached
+        return dict(zip(columns, rows[0]))
+
+    def fill_many(self, objs=[]):
+        '''
+        Method:       fill_many
+        Description:  Fills many objects and/or dictionaries (see the fill method) with chunked
+                      SELECT ... WHERE id IN (...) queries instead of one query per object.
+        Parameters:
+            self:     The current object reference.
+            objs:     A list of objects and/or dictionaries with the primary key assigned (default a empty list - []).
+        Return:       A list with the primary keys that were not found - [], or None on errors (the objects of
+                      the chunks read before the error are filled).
+        Usage:        missing = gd.fill_many([p1, p2, {'id': 3}])
+                      NOTE: See the description of the constructor (method __init__) of this class above to
+                      understand what the gd variable is.
+        '''
+        if not (self.connection.reference and self.__model_class):
+            return []
+        meta = self.__metadata
+        pk = meta.primary_key
+        # primary key as text => objects and dictionaries to fill. The keys are compared as text (like the
+        # cache does), the driver may return them with other types ('7' for 7, Decimal for int...).
+        wanted = {}
+        ids = []
+        for item in objs:
+            if isinstance(item, dict):
+                id = item.get(pk)
+            elif isinstance(item, self.__model_class):
+                id = getattr(item, pk)
+            else:
+                continue
+            if id is not None:
+                key = str(id)
+                if key not in wanted:
+                    wanted[key] = []
+                    ids.append(id)
+                wanted[key].append(item)
+        size = self.connection.max_in_list
+        found = set()
+        for start in range(0, len(ids), size):
+            chunk = ids[start:start + size]
+            sql = self.__statement('fill_many', (pk,), len(chunk))
+            if sql is None:
+                sql = 'SELECT * FROM %s WHERE %s IN (%s)' % (self.__model_name, pk, ', '.join(
+                    self.connection.placeholder(i) for i in range(len(chunk))))
+                sql = self.__statement('fill_many', (pk,), len(chunk), sql)
+            try:
+                columns, rows = self.__fetch(sql, chunk)
+            except Exception as e:
+                print(e)
+                return None
+            for row in rows:
+                data = dict(zip(columns, row))
+                key = str(data[pk])
+                found.add(key)
+                for item in wanted.get(key, ()):
+                    if isinstance(item, dict):
+                        item.update(data)
+                    else:
+                        meta.assign(item, data)
+                        meta.snapshot(item)
+        return [id for id in ids if str(id) not in found]
 
 
 if __name__ == '__main__':
@@ -10,12 +10,201 @@ Created on 28/03/2014
 __author__ = 'Thiago Alexandre Martins Monteiro'
 __date__ = '24/11/2012'
 
+import collections
+import contextlib
+import functools
+import itertools
+import threading
+import time
+
+from pydao.orm.metadata import metadata
+
+# Shapes of the rows returned by the cursors of a connection (see Connection.row_factory),
+# a model class can also be used to receive objects of the model.
+TUPLE = 'tuple'
+NAMEDTUPLE = 'namedtuple'
+DICT = 'dict'
+
+# (row factory, column names) => function that converts a tuple row.
+_converters = {}
+
+
+def row_converter(row_factory, columns):
+    '''
+    Function:        row_converter
+    Description:     Returns the function that converts a tuple row with the given columns to the shape of
+                     the row factory, or None for tuples. It is built once per row factory and column set.
+    Parameters:
+        row_factory: TUPLE, NAMEDTUPLE, DICT or a model class.
+        columns:     A tuple with the column names.
+    Return:          A function (row => converted row) or None.
+    Usage:           convert = row_converter(NAMEDTUPLE, ('id', 'nome'))
+    '''
+    key = (row_factory, columns)
+    try:
+        return _converters[key]
+    except KeyError:
+        pass
+    if row_factory in (None, TUPLE):
+        convert = None
+    elif row_factory == NAMEDTUPLE:
+        convert = collections.namedtuple('Row', columns, rename=True)._make
+    elif row_factory == DICT:
+        def convert(row):
+            return dict(zip(columns, row))
+    else:
+        # Oracle returns the column names in uppercase.
+        meta = metadata(row_factory)
+        convert = meta.hydrator(tuple(
+            c if meta.has_column(c) or not meta.has_column(c.lower()) else c.lower() for c in columns))
+    _converters[key] = convert
+    return convert
+
+
+class RowCursor(object):
+    '''
+    Class:       RowCursor
+    Module:      pydao.db
+    Description: Wraps a cursor that returns tuples and converts the fetched rows to the shape of a row
+                 factory (see Connection.row_factory), the other attributes are the ones of the wrapped cursor.
+    '''
+
+    def __init__(self, cursor, row_factory):
+        '''
+        Method:          __init__
+        Description:     Constructor that initializes objects of this class.
+                         NOTE: it is a magic method.
+        Parameters:
+            self:        The current object reference.
+            cursor:      A DB-API cursor that returns tuples.
+            row_factory: NAMEDTUPLE, DICT or a model class.
+        Return:          none.
+        Usage:           cur = RowCursor(conn.tuple_cursor, DICT)
+        '''
+        self.__cursor = cursor
+        self.__row_factory = row_factory
+        self.__convert = None
+        self.__stale = True
+
+    @property
+    def cursor(self):
+        '''
+        Property:    cursor
+        Description: Returns the wrapped cursor.
+        Parameters:
+            self:    The current object reference.
+        Return:      The cursor reference.
+        Usage:       raw = cur.cursor
+        '''
+        return self.__cursor
+
+    def __converter(self):
+        # The converter depends on the columns of the last statement.
+        if self.__stale:
+            description = self.__cursor.description
+            self.__convert = row_converter(
+                self.__row_factory, tuple(d[0] for d in description)) if description else None
+            self.__stale = False
+        return self.__convert
+
+    def execute(self, sql, params=None):
+        self.__stale = True
+        if params is None:
+            self.__cursor.execute(sql)
+        else:
+            self.__cursor.execute(sql, params)
+        return self
+
+    def executemany(self, sql, params):
+        self.__stale = True
+        self.__cursor.executemany(sql, params)
+        return self
+
+    def fetchone(self):
+        row = self.__cursor.fetchone()
+        convert = self.__converter()
+        if row is None or convert is None:
+            return row
+        return convert(row)
+
+    def fetchmany(self, size=None):
+        rows = self.__cursor.fetchmany(size) if size else self.__cursor.fetchmany()
+        convert = self.__converter()
+        return rows if convert is None else list(map(convert, rows))
+
+    def fetchall(self):
+        rows = self.__cursor.fetchall()
+        convert = self.__converter()
+        return rows if convert is None else list(map(convert, rows))
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(self.__cursor.arraysize or 100)
+            if not rows:
+                return
+            for row in rows:
+                yield row
+
+    @property
+    def arraysize(self):
+        return self.__cursor.arraysize
+
+    @arraysize.setter
+    def arraysize(self, arraysize):
+        self.__cursor.arraysize = arraysize
+
+    def close(self):
+        self.__cursor.close()
+
+    def __getattr__(self, name):
+        # description, rowcount, lastrowid...
+        return getattr(self.__cursor, name)
+
+
+class ManagedCursor(object):
+    '''
+    Class:       ManagedCursor
+    Module:      pydao.db
+    Description: Context manager of a cursor (see Connection.open_cursor) that closes it at the end of the
+                 block, unless the cursor is shared by the statements of a transaction.
+    '''
+
+    def __init__(self, cursor, close=True):
+        '''
+        Method:      __init__
+        Description: Constructor that initializes objects of this class.
+                     NOTE: it is a magic method.
+        Parameters:
+            self:    The current object reference.
+            cursor:  The cursor reference.
+            close:   Indicates whether the cursor is closed at the end of the block (default True).
+        Return:      none.
+        Usage:       with ManagedCursor(conn.tuple_cursor) as cur: ...
+        '''
+        self.__cursor = cursor
+        self.__close = close
+
+    def __enter__(self):
+        return self.__cursor
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.__close:
+            self.__cursor.close()
+        return False
+
+
 class Connection(object):
     '''
     Class:       Connection
     Module:      pydao.db
     Description: Represent connections to the database.
     '''
+
+    # Optional measurement of the statements run by the cursors of every connection.
+    # Usage: Connection.instrumentation = Instrumentation(slow_threshold=0.5)
+    # (see the pydao.orm.instrumentation module).
+    instrumentation = None
+
     def __init__(self, driver_name=None, dbms=None, host=None, port=None,
                  user=None, password=None, database=None, auto_increment=False,
                  auto_commit=False
@@ -56,9 +245,17 @@ class Connection(object):
                 # Importing module dinamically
                 self.__driver = __import__(driver_name)
         except Exception as e:
-            print(e.message)
+            print(e)
         self.__reference = None
         self.__cursor = None
+        self.__pool = None
+        self.__transaction_depth = 0
+        self.__row_factory = None
+        # Functions that create the cursors of the driver, resolved on the first use.
+        self.__cursor_factory = None
+        self.__server_cursor_factory = None
+        # Cursor shared by the statements of a transaction (see open_cursor).
+        self.__shared_cursor = None
 
     def __del__(self):
         '''
@@ -237,13 +434,140 @@ class Connection(object):
     def cursor(self):
         '''
         Property:    cursor
-        Description: Returns a reference to the cursor of this connection.
+        Description: Returns a new cursor of this connection, its rows have the shape of the row factory.
         Parameters:
             self:    The current object reference.
         Return:      The cursor reference.
         Usage:       cur = conn.cursor
         '''
-        return self.__cursor
+        return self.wrap(self.tuple_cursor)
+
+    @property
+    def tuple_cursor(self):
+        '''
+        Property:    tuple_cursor
+        Description: Returns a new cursor of the driver that returns the rows as tuples, the fastest shape.
+        Parameters:
+            self:    The current object reference.
+        Return:      The cursor reference.
+        Usage:       cur = conn.tuple_cursor
+        '''
+        factory = self.__cursor_factory
+        if factory is None:
+            factory = self.__cursor_factory = self.cursor_factory(False)
+        if Connection.instrumentation is None:
+            return factory()
+        return self.instrument(factory())
+
+    def cursor_factory(self, server=False):
+        '''
+        Method:      cursor_factory
+        Description: Returns the function that creates the cursors (that return tuples) of the driver,
+                     it is resolved once per connection.
+        Parameters:
+            self:    The current object reference.
+            server:  Indicates whether the cursors keep the result in the server (default False).
+        Return:      A function.
+        Usage:       new_cursor = conn.cursor_factory()
+        '''
+        return self.reference.cursor
+
+    def open_cursor(self, reuse=True, tuples=False):
+        '''
+        Method:      open_cursor
+        Description: Returns a context manager of a cursor that is closed at the end of the block. Inside a
+                     transaction (see the transaction method) the blocks share one cursor, closed at the end
+                     of the transaction, unless reuse is False.
+                     NOTE: the result of a statement must be fully read before the next statement of the
+                     transaction is sent.
+        Parameters:
+            self:    The current object reference.
+            reuse:   Indicates whether the cursor of the transaction can be reused (default True).
+            tuples:  Indicates whether the rows are tuples instead of the shape of the row factory (default False).
+        Return:      A ManagedCursor.
+        Usage:       with conn.open_cursor() as cur:
+                         cur.execute('SELECT * FROM produtos')
+                         rows = cur.fetchall()
+        '''
+        if reuse and self.__transaction_depth:
+            cursor = self.__shared_cursor
+            if cursor is None:
+                cursor = self.__shared_cursor = self.tuple_cursor
+            return ManagedCursor(cursor if tuples else self.wrap(cursor), close=False)
+        cursor = self.tuple_cursor
+        return ManagedCursor(cursor if tuples else self.wrap(cursor))
+
+    def instrument(self, cursor):
+        '''
+        Method:      instrument
+        Description: Returns a cursor that reports its statements to Connection.instrumentation, when it
+                     is set, or the cursor itself.
+        Parameters:
+            self:    The current object reference.
+            cursor:  A cursor of the driver.
+        Return:      The cursor reference.
+        Usage:       cur = conn.instrument(conn.reference.cursor())
+        '''
+        instrumentation = Connection.instrumentation
+        if instrumentation is None:
+            return cursor
+        return instrumentation.cursor(cursor, self)
+
+    def wrap(self, cursor):
+        '''
+        Method:      wrap
+        Description: Returns a cursor that returns the rows of a tuple cursor in the shape of the row factory.
+        Parameters:
+            self:    The current object reference.
+            cursor:  A cursor that returns tuples.
+        Return:      The cursor itself (row factory TUPLE) or a RowCursor.
+        Usage:       cur = conn.wrap(conn.tuple_cursor)
+        '''
+        row_factory = self.row_factory
+        if row_factory == TUPLE:
+            return cursor
+        return RowCursor(cursor, row_factory)
+
+    @property
+    def default_row_factory(self):
+        '''
+        Property:    default_row_factory
+        Description: Returns the shape of the rows when no row factory is set: dictionaries on MySQL and
+                     PostgreSQL, tuples on the others (the shapes returned by older versions of this module).
+        Parameters:
+            self:    The current object reference.
+        Return:      TUPLE or DICT.
+        Usage:       row_factory = conn.default_row_factory
+        '''
+        return TUPLE
+
+    @property
+    def row_factory(self):
+        '''
+        Property:    row_factory
+        Description: Returns the shape of the rows returned by the cursors of this connection:
+                     TUPLE, NAMEDTUPLE (built once per column set), DICT or a model class (objects).
+        Parameters:
+            self:    The current object reference.
+        Return:      The row factory.
+        Usage:       row_factory = conn.row_factory
+        '''
+        if self.__row_factory is None:
+            return self.default_row_factory
+        return self.__row_factory
+
+    @row_factory.setter
+    def row_factory(self, row_factory):
+        '''
+        Property:        row_factory
+        Description:     Sets the shape of the rows, the same on every DBMS.
+        Parameters:
+            self:        The current object reference.
+            row_factory: TUPLE, NAMEDTUPLE, DICT, a model class or None (default shape of the DBMS).
+        Return:          none.
+        Usage:           conn.row_factory = NAMEDTUPLE
+        '''
+        self.__row_factory = row_factory
 
     def commit(self):
         '''
@@ -278,11 +602,261 @@ class Connection(object):
         Return:      none.
         Usage:       conn.close()
         '''
-        if self.cursor:
-            self.cursor.close()
+        if self.pool:
+            # Pooled connections are given back to the pool instead of being closed.
+            self.pool.checkin(self)
+            return
+        if self.__cursor:
+            self.__cursor.close()
+        self.__cursor_factory = None
+        self.__server_cursor_factory = None
         if self.reference:
             self.reference.close()
 
+    @property
+    def pool(self):
+        '''
+        Property:    pool
+        Description: Returns the connection pool that owns this connection (None if it is not pooled).
+        Parameters:
+            self:    The current object reference.
+        Return:      A ConnectionPool or None.
+        Usage:       pool = conn.pool
+        '''
+        return self.__pool
+
+    @pool.setter
+    def pool(self, pool):
+        '''
+        Property:    pool
+        Description: Sets the connection pool that owns this connection.
+                     NOTE: it is used by the ConnectionPool class, you should not call it directly.
+        Parameters:
+            self:    The current object reference.
+            pool:    A ConnectionPool or None.
+        Return:      none.
+        Usage:       conn.pool = None
+        '''
+        self.__pool = pool
+
+    def server_cursor(self, name=None):
+        '''
+        Method:      server_cursor
+        Description: Returns a cursor that keeps the result of a query in the database server and fetches
+                     it on demand (fetchmany), so big results are not loaded in memory at once.
+                     NOTE: drivers without server-side cursors return a regular cursor, which already
+                     fetches on demand (sqlite3, cx_Oracle).
+        Parameters:
+            self:    The current object reference.
+            name:    The name of the cursor, used by the drivers that require it (default None).
+        Return:      The cursor reference.
+        Usage:       cur = conn.server_cursor()
+        '''
+        return self.wrap(self.instrument(self.server_cursor_factory()()))
+
+    def server_cursor_factory(self):
+        # The function that creates the server-side cursors, resolved on the first use.
+        factory = self.__server_cursor_factory
+        if factory is None:
+            factory = self.__server_cursor_factory = self.cursor_factory(True)
+        return factory
+
+    def placeholder(self, index=0):
+        '''
+        Method:      placeholder
+        Description: Returns the marker of a bound parameter in the paramstyle of the driver.
+        Parameters:
+            self:    The current object reference.
+            index:   The position (starting at 0) of the parameter in the statement (default 0).
+        Return:      A string.
+        Usage:       mark = conn.placeholder(0)
+        '''
+        return '%s'
+
+    @property
+    def max_parameters(self):
+        '''
+        Property:    max_parameters
+        Description: Returns the maximum number of bound parameters accepted in one statement.
+        Parameters:
+            self:    The current object reference.
+        Return:      An integer.
+        Usage:       limit = conn.max_parameters
+        '''
+        return 999
+
+    @property
+    def max_in_list(self):
+        '''
+        Property:    max_in_list
+        Description: Returns the maximum number of values bound in one IN (...) list.
+        Parameters:
+            self:    The current object reference.
+        Return:      An integer.
+        Usage:       size = conn.max_in_list
+        '''
+        return self.max_parameters
+
+    @property
+    def supports_returning(self):
+        '''
+        Property:    supports_returning
+        Description: Returns a boolean that indicates if the DBMS supports INSERT ... RETURNING.
+        Parameters:
+            self:    The current object reference.
+        Return:      A boolean (True or False).
+        Usage:       returning = conn.supports_returning
+        '''
+        return False
+
+    def reading(self):
+        '''
+        Method:      reading
+        Description: Returns a context manager with the connection for a read (see ConnectionProvider.reading),
+                     for a Connection it is the connection itself.
+        Parameters:
+            self:    The current object reference.
+        Return:      A context manager.
+        Usage:       with conn.reading() as c:
+                         rows = c.tuple_cursor.execute('SELECT * FROM produtos').fetchall()
+        '''
+        return contextlib.nullcontext(self)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        '''
+        Method:      transaction
+        Description: Runs a block of statements in one transaction, that is commited at the end of the
+                     block or rolled back if an error happens. Auto commit is suspended inside the block and
+                     nested blocks join the outermost transaction.
+        Parameters:
+            self:    The current object reference.
+        Return:      A context manager.
+        Usage:       with conn.transaction():
+                         gd.insert(p1)
+                         gd.insert(p2)
+        '''
+        if self.__transaction_depth:
+            self.__transaction_depth += 1
+            try:
+                yield self
+            finally:
+                self.__transaction_depth -= 1
+            return
+        auto_commit = self.auto_commit
+        if auto_commit:
+            self.auto_commit = False
+        self.__transaction_depth = 1
+        try:
+            yield self
+            self.commit()
+        except BaseException:
+            self.rollback()
+            raise
+        finally:
+            self.__transaction_depth = 0
+            if self.__shared_cursor is not None:
+                cursor, self.__shared_cursor = self.__shared_cursor, None
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+            if auto_commit:
+                self.auto_commit = True
+
+    @property
+    def in_transaction(self):
+        '''
+        Property:    in_transaction
+        Description: Returns a boolean that indicates if a transaction block is running on this connection.
+        Parameters:
+            self:    The current object reference.
+        Return:      A boolean (True or False).
+        Usage:       if conn.in_transaction: ...
+        '''
+        return self.__transaction_depth > 0
+
+    @property
+    def uncommitted(self):
+        '''
+        Property:    uncommitted
+        Description: Returns a boolean that indicates if the driver has a transaction open with statements not
+                     commited yet (with auto commit disabled, the implicit transaction started by a write).
+                     NOTE: it is False when the driver does not tell it (MySQLdb).
+        Parameters:
+            self:    The current object reference.
+        Return:      A boolean (True or False).
+        Usage:       if conn.uncommitted: conn.commit()
+        '''
+        return bool(self.reference and getattr(self.reference, 'in_transaction', False))
+
+    def ping(self):
+        '''
+        Method:      ping
+        Description: Checks cheaply if the connection with the database is still usable.
+        Parameters:
+            self:    The current object reference.
+        Return:      A boolean (True or False).
+        Usage:       alive = conn.ping()
+        '''
+        if not self.reference:
+            return False
+        try:
+            cursor = self.reference.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchall()
+            cursor.close()
+        except Exception:
+            return False
+        return True
+
+    def reset(self, auto_commit=None):
+        '''
+        Method:          reset
+        Description:     Undoes any pending transaction and restores the auto commit state of the connection.
+        Parameters:
+            self:        The current object reference.
+            auto_commit: The auto commit state to restore (default None - keeps the current state).
+        Return:          none.
+        Usage:           conn.reset(auto_commit=True)
+        '''
+        if self.reference:
+            self.reference.rollback()
+            if auto_commit is not None and auto_commit != self.auto_commit:
+                self.auto_commit = auto_commit
+
+    def __enter__(self):
+        '''
+        Method:      __enter__
+        Description: Allows to use the connection in a with statement.
+                     NOTE: it is a magic method.
+        Parameters:
+            self:    The current object reference.
+        Return:      The connection itself.
+        Usage:       with pool.connection() as conn: ...
+        '''
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        '''
+        Method:      __exit__
+        Description: Commits (or rollbacks if an error happened) the pending transaction and closes
+                     the connection, pooled connections are given back to its pool.
+                     NOTE: it is a magic method.
+        Parameters:
+            self:    The current object reference.
+        Return:      False (errors are not suppressed).
+        Usage:       with pool.connection() as conn: ...
+        '''
+        try:
+            if exc_type:
+                self.rollback()
+            else:
+                self.commit()
+        finally:
+            self.close()
+        return False
+
 class MySQLConnection(Connection):
     '''
     Class:       MySQLConnection
@@ -319,7 +893,7 @@ class MySQLConnection(Connection):
 
     @Connection.auto_commit.setter
     def auto_commit(self, auto_commit):
-        Connection.auto_commit = auto_commit
+        Connection.auto_commit.fset(self, auto_commit)
         self.__reference.autocommit(auto_commit)
 
     @property
@@ -327,8 +901,27 @@ class MySQLConnection(Connection):
         return self.__reference
 
     @property
-    def cursor(self):
-        return self.reference.cursor(self.driver.cursors.DictCursor)
+    def default_row_factory(self):
+        return DICT
+
+    def cursor_factory(self, server=False):
+        # The server-side cursors keep the rows in the server until fetched, the result must be
+        # fully read (or the cursor closed) before the connection runs another statement.
+        if server:
+            return functools.partial(self.reference.cursor, self.driver.cursors.SSCursor)
+        return self.reference.cursor
+
+    @property
+    def max_parameters(self):
+        return 65535
+
+    def ping(self):
+        # MySQLdb checks the connection without running a statement.
+        try:
+            self.reference.ping()
+        except Exception:
+            return False
+        return True
 
 
 class PostgreSQLConnection(Connection):
@@ -338,6 +931,10 @@ class PostgreSQLConnection(Connection):
     Description: Represents database connections to PostgreSQL database server (DBMS - DATABASE MANAGEMENT SYSTEM).
     
     '''
+
+    # Sequence used to name the server-side cursors.
+    __cursor_names = itertools.count(1)
+
     def __init__(
         self, host=None, port=None, user=None, password=None,
         database=None, auto_increment=False, auto_commit=False
@@ -364,7 +961,7 @@ class PostgreSQLConnection(Connection):
 
     @Connection.auto_commit.setter
     def auto_commit(self, auto_commit):
-        Connection.auto_commit = auto_commit
+        Connection.auto_commit.fset(self, auto_commit)
         self.__reference.autocommit = auto_commit
         # ISOLATION_LEVEL_AUTOCOMMIT 0
         # ISOLATION_LEVEL_READ_COMMITED 1 (Default)
@@ -376,11 +973,37 @@ class PostgreSQLConnection(Connection):
         return self.__reference
 
     @property
-    def cursor(self):
-        # The line below makes a dynamic import it is the same that 
-        # from psycopg2.extras import RealDictCursor
-        module = __import__('%s.extras' % self.driver_name, globals(), locals(), ['RealDictCursor'], -1)
-        return self.reference.cursor(cursor_factory=module.RealDictCursor)
+    def default_row_factory(self):
+        return DICT
+
+    def server_cursor(self, name=None):
+        # A named cursor is declared in the server, with auto commit it has to survive
+        # the end of the implicit transaction (WITH HOLD).
+        if not name:
+            name = 'pydao_cursor_%d' % next(PostgreSQLConnection.__cursor_names)
+        return self.wrap(self.instrument(
+            self.server_cursor_factory()(name=name, withhold=bool(self.auto_commit))))
+
+    @property
+    def max_parameters(self):
+        return 65535
+
+    @property
+    def supports_returning(self):
+        return True
+
+    @property
+    def uncommitted(self):
+        if not self.reference:
+            return False
+        extensions = self.driver.extensions
+        return self.reference.get_transaction_status() in (
+            extensions.TRANSACTION_STATUS_INTRANS, extensions.TRANSACTION_STATUS_INERROR)
+
+    def ping(self):
+        if not self.reference or self.reference.closed:
+            return False
+        return Connection.ping(self)
 
 
 class OracleConnection(Connection):
@@ -415,16 +1038,36 @@ class OracleConnection(Connection):
 
     @Connection.auto_commit.setter
     def auto_commit(self, auto_commit):
-        Connection.auto_commit = auto_commit
+        Connection.auto_commit.fset(self, auto_commit)
         self.__reference.autocommit = auto_commit
 
     @property
     def reference(self):
         return self.__reference
 
+    def placeholder(self, index=0):
+        return ':%d' % (index + 1)
+
     @property
-    def cursor(self):
-        return self.reference.cursor()
+    def max_parameters(self):
+        return 65535
+
+    @property
+    def max_in_list(self):
+        # Oracle accepts at most 1000 expressions in a IN list (ORA-01795).
+        return 1000
+
+    @property
+    def uncommitted(self):
+        # Told by python-oracledb, False with the older cx_Oracle.
+        return bool(self.reference and getattr(self.reference, 'transaction_in_progress', False))
+
+    def ping(self):
+        try:
+            self.reference.ping()
+        except Exception:
+            return False
+        return True
 
 
 class SQLiteConnection(Connection):
@@ -435,18 +1078,20 @@ class SQLiteConnection(Connection):
     '''
     def __init__(self, database, auto_increment=False, auto_commit=False):
         Connection.__init__(
-            self, driver_name='sqlite3', sgbd='sqlite',
+            self, driver_name='sqlite3', dbms='sqlite',
             host=None, port=None, user=None, password=None,
             database=database, auto_increment=auto_increment,
             auto_commit=auto_commit
         )
         if self.database:
-            self.__reference = self.driver.connect(database)
+            # The connection may be handed to other threads by a ConnectionPool,
+            # but it is never used by two threads at the same time.
+            self.__reference = self.driver.connect(database, check_same_thread=False)
             self.auto_commit = auto_commit
 
     @Connection.auto_commit.setter
     def auto_commit(self, auto_commit):
-        Connection.auto_commit = auto_commit
+        Connection.auto_commit.fset(self, auto_commit)
         if auto_commit:
             self.__reference.isolation_level = None
         else:
@@ -456,9 +1101,652 @@ class SQLiteConnection(Connection):
     def reference(self):
         return self.__reference
 
+    def placeholder(self, index=0):
+        return '?'
+
     @property
-    def cursor(self):
-        return self.reference.cursor()
+    def max_parameters(self):
+        # SQLITE_MAX_VARIABLE_NUMBER was raised from 999 to 32766 in SQLite 3.32.
+        if self.driver.sqlite_version_info >= (3, 32, 0):
+            return 32766
+        return 999
+
+    @property
+    def supports_returning(self):
+        return self.driver.sqlite_version_info >= (3, 35, 0)
+
+
+class PoolError(Exception):
+    '''
+    Class:       PoolError
+    Module:      pydao.db
+    Description: Raised when a connection pool can not give a connection.
+    '''
+    pass
+
+
+class PoolTimeout(PoolError):
+    '''
+    Class:       PoolTimeout
+    Module:      pydao.db
+    Description: Raised when no connection of a pool became free before the timeout expired.
+    '''
+    pass
+
+
+class ConnectionPool(object):
+    '''
+    Class:       ConnectionPool
+    Module:      pydao.db
+    Description: Keeps a set of open connections to a database that are reused between checkouts
+                 instead of opening (handshake and authentication) a new connection every time.
+    '''
+    def __init__(self, dbms=None, host=None, port=None, user=None, password=None,
+                 database=None, auto_increment=False, auto_commit=False, min_size=1,
+                 max_size=10, max_idle=300, max_lifetime=3600, timeout=30, validate_after=0,
+                 row_factory=None
+    ):
+        '''
+        Method:             __init__
+        Description:        Constructor that initializes objects of this class and opens min_size connections.
+                            NOTE: it is a magic method.
+        Parameters:
+            self:           The current object reference.
+            dbms ... row_factory: The same parameters of the DriverManager.connection method.
+            min_size:       Number of connections always kept open (default 1).
+            max_size:       Maximum number of connections open at the same time (default 10).
+            max_idle:       Seconds that a connection above min_size can stay idle before be closed (default 300).
+            max_lifetime:   Seconds that a connection can live before be replaced (default 3600).
+            timeout:        Seconds to wait for a free connection on checkout (default 30).
+            validate_after: Idle seconds after which a connection is pinged on checkout (default 0 - always).
+        Return:             none.
+        Usage:              pool = ConnectionPool(dbms='sqlite', database='pydao.db', max_size=5)
+        '''
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError('Invalid pool size: min_size=%s, max_size=%s' % (min_size, max_size))
+        self.__settings = dict(
+            dbms=dbms, host=host, port=port, user=user, password=password,
+            database=database, auto_increment=auto_increment, auto_commit=auto_commit,
+            row_factory=row_factory
+        )
+        self.__auto_commit = auto_commit
+        self.__row_factory = row_factory
+        self.__min_size = min_size
+        self.__max_size = max_size
+        self.__max_idle = max_idle
+        self.__max_lifetime = max_lifetime
+        self.__timeout = timeout
+        self.__validate_after = validate_after
+        self.__condition = threading.Condition()
+        # Idle connections as [connection, created, last_used], the most recently used at the right.
+        self.__idle = collections.deque()
+        # Connections in use by id as [connection, created, checked_out].
+        self.__used = {}
+        self.__opening = 0
+        self.__closed = False
+        self.__started = time.time()
+        self.__checkouts = 0
+        self.__timeouts = 0
+        self.__created = 0
+        self.__discarded = 0
+        self.__wait_time = 0.0
+        self.__max_wait_time = 0.0
+        self.__busy_time = 0.0
+        self.__peak = 0
+        for i in range(min_size):
+            conn = self.__open()
+            self.__idle.append([conn, time.time(), time.time()])
+
+    @property
+    def size(self):
+        '''
+        Property:    size
+        Description: Returns the number of connections currently open (idle, in use or being opened).
+        Parameters:
+            self:    The current object reference.
+        Return:      An integer.
+        Usage:       size = pool.size
+        '''
+        return len(self.__idle) + len(self.__used) + self.__opening
+
+    @property
+    def closed(self):
+        '''
+        Property:    closed
+        Description: Returns a boolean that indicates if the pool was closed.
+        Parameters:
+            self:    The current object reference.
+        Return:      A boolean (True or False).
+        Usage:       closed = pool.closed
+        '''
+        return self.__closed
+
+    def __open(self):
+        conn = DriverManager.connection(**self.__settings)
+        if conn is None or not conn.reference:
+            raise PoolError('Could not open a connection to the DBMS %s' % self.__settings['dbms'])
+        conn.pool = self
+        with self.__condition:
+            self.__created += 1
+        return conn
+
+    def __discard(self, conn):
+        conn.pool = None
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self.__condition:
+            self.__discarded += 1
+
+    def __expired(self, created, now):
+        return self.__max_lifetime is not None and now - created >= self.__max_lifetime
+
+    def __sweep(self, now):
+        # Must be called with the lock held, returns the idle connections to close.
+        stale = []
+        if self.__max_idle is None:
+            return stale
+        while self.__idle and self.size > self.__min_size and \
+                now - self.__idle[0][2] >= self.__max_idle:
+            stale.append(self.__idle.popleft()[0])
+        return stale
+
+    def checkout(self, timeout=None):
+        '''
+        Method:      checkout
+        Description: Takes a connection from the pool, opening a new one if there is no idle connection
+                     and the pool is not full, or waiting for one to be given back otherwise.
+        Parameters:
+            self:    The current object reference.
+            timeout: Seconds to wait for a free connection (default None - the timeout of the pool).
+        Return:      A Connection (it can be used in a with statement that gives it back to the pool).
+        Usage:       conn = pool.checkout()
+        '''
+        if timeout is None:
+            timeout = self.__timeout
+        start = time.time()
+        deadline = start + timeout
+        while True:
+            stale = []
+            record = None
+            with self.__condition:
+                while True:
+                    if self.__closed:
+                        raise PoolError('The connection pool is closed.')
+                    if self.__idle:
+                        record = self.__idle.pop()
+                        break
+                    if self.size < self.__max_size:
+                        self.__opening += 1
+                        break
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.__timeouts += 1
+                        raise PoolTimeout('No connection available after %s seconds.' % timeout)
+                    self.__condition.wait(remaining)
+                stale = self.__sweep(time.time())
+            for conn in stale:
+                self.__discard(conn)
+            now = time.time()
+            if record is None:
+                try:
+                    conn = self.__open()
+                finally:
+                    with self.__condition:
+                        self.__opening -= 1
+                        self.__condition.notify()
+                created = now
+            else:
+                conn, created, last_used = record
+                if self.__expired(created, now) or \
+                        (now - last_used >= self.__validate_after and not conn.ping()):
+                    self.__discard(conn)
+                    continue
+            with self.__condition:
+                wait = time.time() - start
+                self.__used[id(conn)] = [conn, created, time.time()]
+                self.__checkouts += 1
+                self.__wait_time += wait
+                self.__max_wait_time = max(self.__max_wait_time, wait)
+                self.__peak = max(self.__peak, len(self.__used))
+            return conn
+
+    # A connection is a context manager that gives itself back to the pool.
+    connection = checkout
+
+    def checkin(self, conn):
+        '''
+        Method:      checkin
+        Description: Gives back a connection to the pool, rolling back any pending transaction.
+                     NOTE: conn.close() on a pooled connection does the same.
+        Parameters:
+            self:    The current object reference.
+            conn:    A connection taken from this pool.
+        Return:      none.
+        Usage:       pool.checkin(conn)
+        '''
+        with self.__condition:
+            record = self.__used.pop(id(conn), None)
+            if record is None or record[0] is not conn:
+                return
+            now = time.time()
+            self.__busy_time += now - record[2]
+        try:
+            conn.reset(self.__auto_commit)
+            conn.row_factory = self.__row_factory
+            usable = True
+        except Exception:
+            usable = False
+        with self.__condition:
+            if usable and not self.__closed and not self.__expired(record[1], now):
+                self.__idle.append([conn, record[1], now])
+                conn = None
+            stale = self.__sweep(now)
+            self.__condition.notify()
+        if conn is not None:
+            self.__discard(conn)
+        for conn in stale:
+            self.__discard(conn)
+
+    def close(self):
+        '''
+        Method:      close
+        Description: Closes the idle connections of the pool, connections in use are closed when given back.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       pool.close()
+        '''
+        with self.__condition:
+            self.__closed = True
+            idle = [record[0] for record in self.__idle]
+            self.__idle.clear()
+            self.__condition.notify_all()
+        for conn in idle:
+            self.__discard(conn)
+
+    def stats(self):
+        '''
+        Method:      stats
+        Description: Returns the metrics of the pool: sizes, utilization and wait time on checkout.
+        Parameters:
+            self:    The current object reference.
+        Return:      A dictionary - {}.
+        Usage:       print(pool.stats()['utilization'])
+        '''
+        with self.__condition:
+            now = time.time()
+            in_use = len(self.__used)
+            busy = self.__busy_time + sum(now - r[2] for r in self.__used.values())
+            elapsed = max(now - self.__started, 1e-9)
+            return {
+                'size': self.size,
+                'idle': len(self.__idle),
+                'in_use': in_use,
+                'peak_in_use': self.__peak,
+                'min_size': self.__min_size,
+                'max_size': self.__max_size,
+                'utilization': float(in_use) / self.__max_size,
+                'average_utilization': busy / (elapsed * self.__max_size),
+                'checkouts': self.__checkouts,
+                'timeouts': self.__timeouts,
+                'created': self.__created,
+                'discarded': self.__discarded,
+                'wait_time_total': self.__wait_time,
+                'wait_time_max': self.__max_wait_time,
+                'wait_time_avg': self.__wait_time / self.__checkouts if self.__checkouts else 0.0,
+            }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class ConnectionProvider(object):
+    '''
+    Class:       ConnectionProvider
+    Module:      pydao.db
+    Description: Base class of the objects that give a different Connection depending on the context of
+                 the call (see the current property). A GenericDAO created with a provider resolves its
+                 connection on every call, the other attributes of a provider are the ones of the current
+                 connection (conn.dbms, conn.transaction()...).
+    '''
+
+    @property
+    def current(self):
+        '''
+        Property:    current
+        Description: Returns the connection to be used now.
+                     NOTE: it must be implemented by the subclasses.
+        Parameters:
+            self:    The current object reference.
+        Return:      A Connection.
+        Usage:       conn = provider.current
+        '''
+        raise NotImplementedError('%s.current' % self.__class__.__name__)
+
+    def reader(self):
+        '''
+        Method:      reader
+        Description: Returns the connection for a read and a token that is given back to the done method when
+                     the read finishes.
+        Parameters:
+            self:    The current object reference.
+        Return:      A tuple (Connection, token).
+        Usage:       conn, token = provider.reader()
+        '''
+        return self.current, None
+
+    def done(self, token):
+        '''
+        Method:      done
+        Description: Tells that a read started by reader finished.
+        Parameters:
+            self:    The current object reference.
+            token:   The token returned by reader with the connection.
+        Return:      none.
+        Usage:       provider.done(token)
+        '''
+        pass
+
+    def written(self):
+        '''
+        Method:      written
+        Description: Tells that the current thread wrote on the connection, it is called by the GenericDAO
+                     writes (see GenericDAO.invalidate).
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       provider.written()
+        '''
+        pass
+
+    def reading(self):
+        '''
+        Method:      reading
+        Description: Returns a context manager with the connection for a read (see the reader and done methods).
+        Parameters:
+            self:    The current object reference.
+        Return:      A context manager.
+        Usage:       with provider.reading() as conn:
+                         ...
+        '''
+        return _Reading(self)
+
+    def __getattr__(self, name):
+        return getattr(self.current, name)
+
+
+class _Reading(object):
+    # Context manager of a read on a ConnectionProvider.
+
+    def __init__(self, provider):
+        self.__provider = provider
+        self.__conn = None
+        self.__token = None
+
+    def __enter__(self):
+        self.__conn, self.__token = self.__provider.reader()
+        return self.__conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__provider.done(self.__token)
+        return False
+
+
+class _ThreadConnection(object):
+    # Connection of a thread taken from a pool, given back when the thread ends
+    # (the thread local storage of the thread is deleted) or when released.
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.connection = pool.checkout()
+
+    def release(self):
+        conn, self.connection = self.connection, None
+        if conn is not None:
+            self.pool.checkin(conn)
+
+    def __del__(self):
+        try:
+            self.release()
+        except Exception:
+            pass
+
+
+class ThreadLocalConnection(ConnectionProvider):
+    '''
+    Class:       ThreadLocalConnection
+    Module:      pydao.db
+    Description: Gives each thread its own connection, taken from a connection pool on the first use in the
+                 thread and given back when the thread ends (or on release), so one GenericDAO can serve
+                 many threads without locks. The max_size of the pool limits the number of threads using
+                 the database at the same time.
+                 NOTE: do not close the connections of this object, use release instead.
+    Usage:       conn = ThreadLocalConnection(DriverManager.pool(dbms='sqlite', database='pydao.db', max_size=16))
+                 gd = GenericDAO(connection=conn, model=Produto)
+                 # gd can be used by the threads of a thread pool.
+    '''
+
+    def __init__(self, pool):
+        '''
+        Method:      __init__
+        Description: Constructor that initializes objects of this class.
+                     NOTE: it is a magic method.
+        Parameters:
+            self:    The current object reference.
+            pool:    The ConnectionPool that opens the connections (see DriverManager.pool).
+        Return:      none.
+        Usage:       conn = ThreadLocalConnection(pool)
+        '''
+        self.__pool = pool
+        self.__local = threading.local()
+
+    @property
+    def pool(self):
+        '''
+        Property:    pool
+        Description: Returns the connection pool of this object.
+        Parameters:
+            self:    The current object reference.
+        Return:      A ConnectionPool.
+        Usage:       stats = conn.pool.stats()
+        '''
+        return self.__pool
+
+    @property
+    def current(self):
+        '''
+        Property:    current
+        Description: Returns the connection of the current thread, taking one from the pool on the first use.
+        Parameters:
+            self:    The current object reference.
+        Return:      A Connection.
+        Usage:       conn = provider.current
+        '''
+        holder = getattr(self.__local, 'holder', None)
+        if holder is None or holder.connection is None:
+            holder = self.__local.holder = _ThreadConnection(self.__pool)
+        return holder.connection
+
+    def release(self):
+        '''
+        Method:      release
+        Description: Gives back the connection of the current thread to the pool (if it has one), the next
+                     use in the thread takes a connection again.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       conn.release()
+        '''
+        holder = getattr(self.__local, 'holder', None)
+        if holder is not None:
+            self.__local.holder = None
+            holder.release()
+
+    def close(self):
+        '''
+        Method:      close
+        Description: Gives back the connection of the current thread and closes the pool.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       conn.close()
+        '''
+        self.release()
+        self.__pool.close()
+
+
+class RoutingConnection(ConnectionProvider):
+    '''
+    Class:       RoutingConnection
+    Module:      pydao.db
+    Description: Splits the work between a primary database and its read replicas: the reads of a GenericDAO
+                 (select, select_objects, fill, count...) go to the replicas and the writes, the reads inside a
+                 transaction and the reads of a thread shortly after it wrote (read-your-writes) go to the
+                 primary. The other attributes are the ones of the primary connection.
+                 The primary and the replicas can be Connections or ConnectionProviders (like
+                 ThreadLocalConnection, needed to use it from many threads).
+    Usage:       conn = RoutingConnection(primary, [replica1, replica2], strategy='least_loaded', sticky=2.0)
+                 gd = GenericDAO(connection=conn, model=Produto)
+    '''
+
+    ROUND_ROBIN = 'round_robin'
+    LEAST_LOADED = 'least_loaded'
+
+    def __init__(self, primary, replicas=(), strategy='round_robin', sticky=0.0):
+        '''
+        Method:       __init__
+        Description:  Constructor that initializes objects of this class.
+                      NOTE: it is a magic method.
+        Parameters:
+            self:     The current object reference.
+            primary:  The connection of the primary database.
+            replicas: A list with the connections of the replicas (default () - everything goes to the primary).
+            strategy: How a replica is chosen for each read: 'round_robin' (in turns) or 'least_loaded' (the one
+                      with less reads running) (default 'round_robin').
+            sticky:   Seconds after a write in which the reads of the same thread go to the primary, so they
+                      see the write even if the replicas are behind (default 0.0).
+        Return:       none.
+        Usage:        conn = RoutingConnection(primary, [replica], sticky=1.0)
+        '''
+        if strategy not in (RoutingConnection.ROUND_ROBIN, RoutingConnection.LEAST_LOADED):
+            raise ValueError('Unknown routing strategy: %s' % strategy)
+        self.__primary = primary
+        self.__replicas = tuple(replicas)
+        self.__strategy = strategy
+        self.__sticky = sticky
+        self.__next = itertools.count()
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        # Reads running and reads done by replica, reads that went to the primary.
+        self.__running = [0] * len(self.__replicas)
+        self.__reads = [0] * len(self.__replicas)
+        self.__primary_reads = 0
+
+    @property
+    def primary(self):
+        return self.__primary
+
+    @property
+    def replicas(self):
+        return self.__replicas
+
+    @property
+    def sticky(self):
+        return self.__sticky
+
+    @sticky.setter
+    def sticky(self, sticky):
+        self.__sticky = sticky
+
+    @staticmethod
+    def __resolve(conn):
+        if isinstance(conn, ConnectionProvider):
+            return conn.current
+        return conn
+
+    @property
+    def current(self):
+        '''
+        Property:    current
+        Description: Returns the connection of the primary database, used by the writes.
+        Parameters:
+            self:    The current object reference.
+        Return:      A Connection.
+        Usage:       conn = router.current
+        '''
+        return RoutingConnection.__resolve(self.__primary)
+
+    def __pinned(self, primary):
+        # Reads that must go to the primary: inside a transaction (a transaction block or, without auto
+        # commit, writes not commited yet) or shortly after a write.
+        if not self.__replicas or primary.in_transaction or primary.uncommitted:
+            return True
+        if self.__sticky:
+            written = getattr(self.__local, 'written', None)
+            return written is not None and time.time() - written < self.__sticky
+        return False
+
+    def reader(self):
+        '''
+        Method:      reader
+        Description: Returns the connection for a read: a replica chosen by the strategy or the primary (see the
+                     description of the class), and the index of the replica (None for the primary) that is
+                     given back to done.
+        Parameters:
+            self:    The current object reference.
+        Return:      A tuple (Connection, index).
+        Usage:       conn, index = router.reader()
+        '''
+        primary = self.current
+        if self.__pinned(primary):
+            with self.__lock:
+                self.__primary_reads += 1
+            return primary, None
+        with self.__lock:
+            if self.__strategy == RoutingConnection.LEAST_LOADED:
+                running = self.__running
+                # The first of the least loaded replicas after the one chosen last, to spread the ties.
+                start = next(self.__next)
+                count = len(running)
+                index = min(((i + start) % count for i in range(count)), key=running.__getitem__)
+            else:
+                index = next(self.__next) % len(self.__replicas)
+            self.__running[index] += 1
+            self.__reads[index] += 1
+        return RoutingConnection.__resolve(self.__replicas[index]), index
+
+    def done(self, index):
+        if index is not None:
+            with self.__lock:
+                if self.__running[index]:
+                    self.__running[index] -= 1
+
+    def written(self):
+        if self.__sticky:
+            self.__local.written = time.time()
+
+    def stats(self):
+        '''
+        Method:      stats
+        Description: Returns the number of reads sent to each replica and to the primary and the reads running
+                     on each replica.
+        Parameters:
+            self:    The current object reference.
+        Return:      A dictionary - {}.
+        Usage:       print(router.stats()['replica_reads'])
+        '''
+        with self.__lock:
+            return {
+                'replica_reads': list(self.__reads),
+                'replica_running': list(self.__running),
+                'primary_reads': self.__primary_reads,
+            }
 
 
 class DriverManager(object):
@@ -474,7 +1762,7 @@ class DriverManager(object):
 
     def connection(self, dbms=None, host=None, port=None, user=None,
                    password=None, database=None, auto_increment=False,
-                   auto_commit=False
+                   auto_commit=False, row_factory=None
     ):
         if dbms:
             dbms = dbms.lower()
@@ -504,11 +1792,37 @@ class DriverManager(object):
                 )
             else:
                 pass
+            if conn is not None and row_factory is not None:
+                conn.row_factory = row_factory
             return conn
 
     # Creating a static method with classmethod function.
     connection = classmethod(connection)
 
+    def pool(self, dbms=None, host=None, port=None, user=None, password=None,
+             database=None, auto_increment=False, auto_commit=False, min_size=1,
+             max_size=10, max_idle=300, max_lifetime=3600, timeout=30, validate_after=0,
+             row_factory=None
+    ):
+        '''
+        Method:      pool
+        Description: Creates a pool of reusable connections for the specified database server.
+                     NOTE: See the ConnectionPool class to understand the parameters.
+        Return:      A ConnectionPool.
+        Usage:       pool = DriverManager.pool(dbms='sqlite', database='pydao.db', max_size=5)
+                     with pool.connection() as conn:
+                         GenericDAO(connection=conn, model=Produto).select()
+        '''
+        return ConnectionPool(
+            dbms=dbms, host=host, port=port, user=user, password=password,
+            database=database, auto_increment=auto_increment, auto_commit=auto_commit,
+            min_size=min_size, max_size=max_size, max_idle=max_idle,
+            max_lifetime=max_lifetime, timeout=timeout, validate_after=validate_after,
+            row_factory=row_factory
+        )
+
+    pool = classmethod(pool)
+
 if __name__ == '__main__':
     conn = DriverManager.connection(dbms='mysql', host='localhost', user='pydao', password='pydao', database='pydao')
     print(conn)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Created on 28/03/2014
+
+@author: thiago-amm
+'''
+
+__author__ = 'Thiago Alexandre Martins Monteiro'
+__date__ = '24/11/2012'
+
+import csv
+import datetime
+import decimal
+import gzip
+import io
+import json
+import time
+
+# Formats of the exported files.
+CSV = 'csv'
+JSONL = 'jsonl'
+
+
+def text(value):
+    '''
+    Function:    text
+    Description: Returns the text of the values that CSV and JSON do not represent by themselves, the same in
+                 both formats: Decimal in fixed-point notation (no exponent, no float rounding), date, time and
+                 datetime in ISO 8601 and binary values in hexadecimal.
+    Parameters:
+        value:   The value.
+    Return:      A string.
+    Usage:       text(Decimal('1E+2')) => '100'
+                 text(datetime.datetime(2014, 3, 28, 10, 30)) => '2014-03-28T10:30:00'
+    '''
+    if isinstance(value, decimal.Decimal):
+        return format(value, 'f')
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).hex()
+    return str(value)
+
+
+# Types written as they are by the csv module (the others are converted by text).
+_plain = (str, int, float, bool)
+
+
+class Output(object):
+    '''
+    Class:       Output
+    Module:      pydao.export
+    Description: Buffered text output of an export over a path or a file object, compressed with gzip when
+                 asked. Files opened by it are closed by close, the file objects given are only flushed.
+    '''
+
+    def __init__(self, target, compress=None, buffer_size=1 << 20):
+        '''
+        Method:          __init__
+        Description:     Constructor that initializes objects of this class.
+                         NOTE: it is a magic method.
+        Parameters:
+            self:        The current object reference.
+            target:      A path or a file object (text, or binary for compress).
+            compress:    Compress with gzip (default None - when the path ends with .gz).
+            buffer_size: The size of the write buffer in bytes (default 1 MiB).
+        Return:          none.
+        Usage:           out = Output('produtos.csv.gz')
+        '''
+        self.__closers = []
+        self.__wrapper = None
+        if isinstance(target, str):
+            if compress is None:
+                compress = target.endswith('.gz')
+            raw = open(target, 'wb', buffering=buffer_size)
+            self.__closers.append(raw.close)
+            self.__owned = True
+        else:
+            raw = target
+            self.__owned = False
+        if isinstance(raw, io.TextIOBase):
+            if compress:
+                raise ValueError('gzip compression requires a path or a binary file object')
+            self.__stream = raw
+            return
+        if compress:
+            # GzipFile does not close the file object it writes to.
+            raw = gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6)
+            self.__closers.insert(0, raw.close)
+        self.__wrapper = io.TextIOWrapper(raw, encoding='utf-8', newline='', write_through=False)
+        self.__stream = self.__wrapper
+
+    @property
+    def stream(self):
+        return self.__stream
+
+    def close(self):
+        '''
+        Method:      close
+        Description: Flushes the text and closes the gzip stream and the files opened by this object.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       out.close()
+        '''
+        self.__stream.flush()
+        if self.__wrapper is not None:
+            if self.__owned:
+                self.__wrapper.close()
+            else:
+                # Leaves the file object of the caller open.
+                self.__wrapper.detach()
+        for close in self.__closers:
+            close()
+
+
+def write(cursor, stream, format=CSV, names=None, chunk_size=10000, progress=None):
+    '''
+    Function:       write
+    Description:    Writes the rows of a cursor that returns tuples, chunk by chunk, to a text stream as CSV (with a
+                    header line) or JSON Lines (one object per row), so the memory used does not depend on the
+                    size of the result. The NULLs are empty fields in CSV and null in JSON, the other types are
+                    written as described by the text function.
+    Parameters:
+        cursor:     A cursor (that returns tuples) after the execute.
+        stream:     A text stream.
+        format:     CSV or JSONL (default CSV).
+        names:      The column names or a function that returns them from the cursor, called after the first
+                    fetch (default None - taken from cursor.description).
+        chunk_size: The number of rows fetched at a time (default 10000).
+        progress:   A function called after each chunk with the number of rows written and the seconds
+                    elapsed (default None).
+    Return:         A dictionary with rows, seconds and rows_per_s.
+    Usage:          cursor.execute('SELECT * FROM produtos')
+                    write(cursor, sys.stdout, JSONL)
+    '''
+    if format not in (CSV, JSONL):
+        raise ValueError('Unknown export format: %s' % format)
+    clock = time.perf_counter
+    start = clock()
+    count = 0
+    rows = cursor.fetchmany(chunk_size)
+    # After the first fetch: the named cursors of PostgreSQL have no description before it.
+    if callable(names):
+        names = names(cursor)
+    names = tuple(names or (d[0] for d in cursor.description))
+    if format == CSV:
+        writer = csv.writer(stream)
+        writer.writerow(names)
+        # Converters of the columns that need them, found from the first value that is not NULL.
+        pending = set(range(len(names)))
+        converters = []
+    else:
+        encode = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=text).encode
+    while rows:
+        if format == CSV:
+            if pending:
+                for i in list(pending):
+                    value = next((row[i] for row in rows if row[i] is not None), None)
+                    if value is not None:
+                        pending.discard(i)
+                        if not isinstance(value, _plain):
+                            converters.append(i)
+            if converters:
+                rows = [list(row) for row in rows]
+                for row in rows:
+                    for i in converters:
+                        if row[i] is not None:
+                            row[i] = text(row[i])
+            writer.writerows(rows)
+        else:
+            stream.write('\n'.join([encode(dict(zip(names, row))) for row in rows]))
+            stream.write('\n')
+        count += len(rows)
+        if progress is not None:
+            progress(count, clock() - start)
+        rows = cursor.fetchmany(chunk_size)
+    seconds = clock() - start
+    return {'rows': count, 'seconds': seconds, 'rows_per_s': count / seconds if seconds else 0.0}
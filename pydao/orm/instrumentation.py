@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Created on 28/03/2014
+
+@author: thiago-amm
+'''
+
+__author__ = 'Thiago Alexandre Martins Monteiro'
+__date__ = '24/11/2012'
+
+import bisect
+import collections
+import re
+import threading
+import time
+
+# Upper bounds (in seconds) of the buckets of the latency histograms: 50 microseconds doubling up
+# to about 6.5 seconds, the slower statements fall in the last bucket.
+BOUNDS = tuple(0.00005 * 2 ** i for i in range(18))
+
+# Literals and lists of placeholders replaced by the shape of a statement.
+_strings = re.compile(r"'(?:[^']|'')*'")
+_numbers = re.compile(r'(?<![\w.:])-?\d+(?:\.\d+)?(?![\w.])')
+_marks = re.compile(r'(?:%s|\?|:\d+)(?:\s*,\s*(?:%s|\?|:\d+))+')
+_rows = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_spaces = re.compile(r'\s+')
+
+
+def shape(sql):
+    '''
+    Function:    shape
+    Description: Returns the shape of a SQL statement: the text with the literals replaced by ? and the lists of
+                 values (IN lists, multi-row VALUES) collapsed, so the statements that differ only in their
+                 values are counted together.
+    Parameters:
+        sql:     The SQL statement (string).
+    Return:      A string.
+    Usage:       shape('SELECT * FROM produtos WHERE id IN (?, ?, ?)') => 'SELECT * FROM produtos WHERE id IN (...)'
+    '''
+    sql = _strings.sub('?', sql)
+    sql = _numbers.sub('?', sql)
+    sql = _marks.sub('...', sql)
+    sql = re.sub(r'\(\s*(?:\.\.\.|%s|\?|:\d+)\s*\)', '(...)', sql)
+    sql = _rows.sub('(...)', sql)
+    return _spaces.sub(' ', sql).strip()
+
+
+class Execution(object):
+    '''
+    Class:       Execution
+    Module:      pydao.instrumentation
+    Description: Describes one execution of a statement, it is given to the hooks of Instrumentation.
+                 timestamp is the time (time.time()) of the execute, the duration (in seconds) counts from
+                 the execute until the last row is fetched (or the cursor runs another statement or is
+                 closed), rows is the number of rows fetched or, when the statement returns no rows, the
+                 number of rows affected.
+    '''
+
+    __slots__ = ('sql', 'shape', 'params', 'connection_id', 'many', 'timestamp', 'started', 'duration',
+                 'rows', 'error')
+
+    def __init__(self, sql, shape, params, connection_id, many=False):
+        self.sql = sql
+        self.shape = shape
+        self.params = params
+        self.connection_id = connection_id
+        self.many = many
+        self.timestamp = time.time()
+        self.started = None
+        self.duration = None
+        self.rows = 0
+        self.error = None
+
+    def __repr__(self):
+        return 'Execution(%r, duration=%r, rows=%r)' % (self.shape, self.duration, self.rows)
+
+
+class Instrumentation(object):
+    '''
+    Class:       Instrumentation
+    Module:      pydao.instrumentation
+    Description: Measures the statements run by the cursors of the connections: pre and post hooks, a
+                 latency histogram per statement shape and a log of the slow statements.
+                 NOTE: it is used when assigned to Connection.instrumentation (None by default), without
+                 it the cursors of the driver are used as they are, with no overhead.
+    Usage:       Connection.instrumentation = Instrumentation(slow_threshold=0.5)
+                 ...
+                 for sql, stats in Connection.instrumentation.stats().items():
+                     print(sql, stats['count'], stats['p99'])
+    '''
+
+    def __init__(self, slow_threshold=1.0, slow_log_size=100, max_shapes=1000):
+        '''
+        Method:             __init__
+        Description:        Constructor that initializes objects of this class.
+                            NOTE: it is a magic method.
+        Parameters:
+            self:           The current object reference.
+            slow_threshold: The duration (in seconds) from which a statement is logged as slow
+                            (default 1.0, None does not log).
+            slow_log_size:  The number of slow statements kept, the oldest are discarded (default 100).
+            max_shapes:     The maximum number of statement shapes with statistics (default 1000), the
+                            statements of new shapes are counted as '<other>' after it.
+        Return:             none.
+        Usage:              instrumentation = Instrumentation(slow_threshold=0.25)
+        '''
+        self.__slow_threshold = slow_threshold
+        self.__slow_log = collections.deque(maxlen=slow_log_size)
+        self.__max_shapes = max_shapes
+        self.__pre = []
+        self.__post = []
+        self.__stats = {}
+        self.__shapes = {}
+        self.__lock = threading.Lock()
+        self.__enabled = True
+
+    @property
+    def enabled(self):
+        return self.__enabled
+
+    @enabled.setter
+    def enabled(self, enabled):
+        self.__enabled = enabled
+
+    @property
+    def slow_threshold(self):
+        return self.__slow_threshold
+
+    @slow_threshold.setter
+    def slow_threshold(self, slow_threshold):
+        self.__slow_threshold = slow_threshold
+
+    def add_hook(self, pre=None, post=None):
+        '''
+        Method:      add_hook
+        Description: Adds functions called with the Execution before the statement runs (pre) and after it
+                     finishes (post). The exceptions raised by the hooks are not caught.
+        Parameters:
+            self:    The current object reference.
+            pre:     A function (default None).
+            post:    A function (default None).
+        Return:      none.
+        Usage:       instrumentation.add_hook(post=lambda e: print(e.shape, e.duration, e.rows))
+        '''
+        if pre is not None:
+            self.__pre.append(pre)
+        if post is not None:
+            self.__post.append(post)
+
+    def remove_hook(self, hook):
+        '''
+        Method:      remove_hook
+        Description: Removes a function added by add_hook.
+        Parameters:
+            self:    The current object reference.
+            hook:    The function.
+        Return:      none.
+        Usage:       instrumentation.remove_hook(log)
+        '''
+        for hooks in (self.__pre, self.__post):
+            while hook in hooks:
+                hooks.remove(hook)
+
+    def cursor(self, cursor, connection):
+        '''
+        Method:         cursor
+        Description:    Returns a cursor that measures the statements run by a cursor of the driver.
+        Parameters:
+            self:       The current object reference.
+            cursor:     A DB-API cursor.
+            connection: The Connection of the cursor.
+        Return:         An InstrumentedCursor or the cursor itself when this object is disabled.
+        Usage:          cur = instrumentation.cursor(conn.reference.cursor(), conn)
+        '''
+        if not self.__enabled:
+            return cursor
+        return InstrumentedCursor(cursor, self, id(connection))
+
+    def start(self, sql, params, connection_id, many=False):
+        # Called by the cursors before the execute.
+        sql_shape = self.__shapes.get(sql)
+        if sql_shape is None:
+            sql_shape = shape(sql)
+            if len(self.__shapes) >= 10 * self.__max_shapes:
+                self.__shapes.clear()
+            self.__shapes[sql] = sql_shape
+        execution = Execution(sql, sql_shape, params, connection_id, many)
+        for hook in self.__pre:
+            hook(execution)
+        execution.started = time.perf_counter()
+        return execution
+
+    def finish(self, execution):
+        # Called by the cursors when the statement finished (see Execution).
+        execution.duration = duration = time.perf_counter() - execution.started
+        with self.__lock:
+            stats = self.__stats.get(execution.shape)
+            if stats is None:
+                key = execution.shape if len(self.__stats) < self.__max_shapes else '<other>'
+                stats = self.__stats.get(key)
+                if stats is None:
+                    stats = self.__stats[key] = {
+                        'count': 0, 'errors': 0, 'rows': 0, 'total': 0.0, 'min': duration, 'max': 0.0,
+                        'histogram': [0] * (len(BOUNDS) + 1)
+                    }
+            stats['count'] += 1
+            stats['rows'] += execution.rows
+            stats['total'] += duration
+            if duration < stats['min']:
+                stats['min'] = duration
+            if duration > stats['max']:
+                stats['max'] = duration
+            if execution.error is not None:
+                stats['errors'] += 1
+            stats['histogram'][bisect.bisect_left(BOUNDS, duration)] += 1
+            if self.__slow_threshold is not None and duration >= self.__slow_threshold:
+                self.__slow_log.append(execution)
+        for hook in self.__post:
+            hook(execution)
+
+    def __percentile(self, histogram, count, percent):
+        # Upper bound of the bucket of the percentile (the maximum for the last bucket).
+        rank = count * percent / 100.0
+        seen = 0
+        for i, n in enumerate(histogram):
+            seen += n
+            if seen >= rank and n:
+                return BOUNDS[i] if i < len(BOUNDS) else None
+        return None
+
+    def stats(self):
+        '''
+        Method:      stats
+        Description: Returns the statistics by statement shape: count, errors, rows, total, min, max and
+                     mean duration, p50/p95/p99 (upper bound of the histogram bucket) and the histogram
+                     (number of statements per bucket, see BOUNDS).
+        Parameters:
+            self:    The current object reference.
+        Return:      A dictionary (shape => dictionary).
+        Usage:       stats = instrumentation.stats()
+        '''
+        result = {}
+        with self.__lock:
+            for key, stats in self.__stats.items():
+                stats = dict(stats, histogram=list(stats['histogram']))
+                stats['mean'] = stats['total'] / stats['count']
+                for p in (50, 95, 99):
+                    stats['p%d' % p] = self.__percentile(
+                        stats['histogram'], stats['count'], p) or stats['max']
+                result[key] = stats
+        return result
+
+    def slow_queries(self):
+        '''
+        Method:      slow_queries
+        Description: Returns the slow statements (see slow_threshold), the oldest first.
+        Parameters:
+            self:    The current object reference.
+        Return:      A list of Execution.
+        Usage:       for e in instrumentation.slow_queries(): print(e.sql, e.params, e.duration)
+        '''
+        with self.__lock:
+            return list(self.__slow_log)
+
+    def reset(self):
+        '''
+        Method:      reset
+        Description: Discards the statistics and the slow statements.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       instrumentation.reset()
+        '''
+        with self.__lock:
+            self.__stats.clear()
+            self.__slow_log.clear()
+
+
+class InstrumentedCursor(object):
+    '''
+    Class:       InstrumentedCursor
+    Module:      pydao.instrumentation
+    Description: Wraps a cursor of the driver and reports its statements to an Instrumentation, the
+                 other attributes are the ones of the wrapped cursor.
+    '''
+
+    def __init__(self, cursor, instrumentation, connection_id):
+        self.__cursor = cursor
+        self.__instrumentation = instrumentation
+        self.__connection_id = connection_id
+        self.__execution = None
+
+    @property
+    def cursor(self):
+        return self.__cursor
+
+    def __finish(self):
+        execution = self.__execution
+        if execution is not None:
+            self.__execution = None
+            self.__instrumentation.finish(execution)
+
+    def __run(self, method, sql, params, many):
+        self.__finish()
+        execution = self.__instrumentation.start(sql, params, self.__connection_id, many)
+        try:
+            if params is None:
+                method(sql)
+            else:
+                method(sql, params)
+        except Exception as e:
+            execution.error = e
+            self.__instrumentation.finish(execution)
+            raise
+        if self.__cursor.description is None:
+            # No rows to fetch, the statement is finished.
+            execution.rows = max(0, self.__cursor.rowcount or 0)
+            self.__instrumentation.finish(execution)
+        else:
+            self.__execution = execution
+        return self
+
+    def execute(self, sql, params=None):
+        return self.__run(self.__cursor.execute, sql, params, False)
+
+    def executemany(self, sql, params):
+        return self.__run(self.__cursor.executemany, sql, params, True)
+
+    def fetchone(self):
+        row = self.__cursor.fetchone()
+        if self.__execution is not None:
+            if row is None:
+                self.__finish()
+            else:
+                self.__execution.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = size or self.__cursor.arraysize
+        rows = self.__cursor.fetchmany(size)
+        if self.__execution is not None:
+            self.__execution.rows += len(rows)
+            if len(rows) < size:
+                self.__finish()
+        return rows
+
+    def fetchall(self):
+        rows = self.__cursor.fetchall()
+        if self.__execution is not None:
+            self.__execution.rows += len(rows)
+            self.__finish()
+        return rows
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany()
+            if not rows:
+                return
+            for row in rows:
+                yield row
+
+    @property
+    def arraysize(self):
+        return self.__cursor.arraysize
+
+    @arraysize.setter
+    def arraysize(self, arraysize):
+        self.__cursor.arraysize = arraysize
+
+    def close(self):
+        self.__finish()
+        self.__cursor.close()
+
+    def __del__(self):
+        # A statement whose rows were not all fetched finishes with the cursor.
+        if self.__execution is not None:
+            self.__finish()
+
+    def __getattr__(self, name):
+        # description, rowcount, lastrowid, var (cx_Oracle)...
+        return getattr(self.__cursor, name)
@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Created on 28/03/2014
+
+@author: thiago-amm
+'''
+
+__author__ = 'Thiago Alexandre Martins Monteiro'
+__date__ = '24/11/2012'
+
+import operator
+import threading
+
+# Attribute of the objects loaded through a DAO that keeps the values read from the database
+# (see ModelMetadata.snapshot), models with __slots__ must declare it to be tracked.
+SNAPSHOT = '_pydao_snapshot'
+
+
+def table_name(class_name):
+    '''
+    Function:       table_name
+    Description:    Returns the name of the table of a model class obeying the rules for naming tables.
+                    To wit: the entity name in plural, lowercase and words separated by underscore.
+    Parameters:
+        class_name: The name of the model class (string).
+    Return:         The table name (string).
+    Usage:          table_name('Produto') => 'produtos'
+                    table_name('ItemPedido') => 'items_pedidos'
+    '''
+    uppers = [c for c in class_name if c.isupper()]
+    if len(uppers) > 1:
+        name = []
+        for i, c in enumerate(class_name):
+            if i > 0 and c.isupper():
+                name.append('s_')
+            name.append(c)
+        name.append('s')
+        return ''.join(name).lower()
+    return '%ss' % class_name.lower()
+
+
+class ModelMetadata(object):
+    '''
+    Class:       ModelMetadata
+    Module:      pydao.metadata
+    Description: Describes how a model class is mapped to a table: table name, ordered columns,
+                 primary key and column types. It is built once per model class and shared.
+    '''
+
+    def __init__(self, model, table=None, columns=None, primary_key='id', types=None, attributes=None):
+        '''
+        Method:          __init__
+        Description:     Constructor that initializes objects of this class.
+                         NOTE: it is a magic method.
+        Parameters:
+            self:        The current object reference.
+            model:       The model class.
+            table:       The table name (default None - derived from the class name).
+            columns:     A list with the column names in order (default None - discovered from an instance).
+            primary_key: The primary key column (default 'id').
+            types:       A dictionary with the Python type of each column (default None).
+            attributes:  A dictionary with the instance attribute that stores each column
+                         (default None - discovered from an instance).
+        Return:          none.
+        Usage:           meta = ModelMetadata(Produto, columns=['id', 'nome', 'preco'])
+        '''
+        if columns is None or attributes is None:
+            discovered = ModelMetadata.discover(model)
+            if columns is None:
+                columns = list(discovered.keys())
+            if attributes is None:
+                attributes = dict((c, discovered.get(c, c)) for c in columns)
+        self.__model = model
+        self.__table = table or table_name(model.__name__)
+        self.__columns = tuple(columns)
+        self.__column_set = frozenset(columns)
+        self.__primary_key = primary_key
+        self.__types = dict(types or {})
+        self.__attributes = dict((c, attributes.get(c, c)) for c in columns)
+        # Models that keep their state in name mangled attributes (self.__x) are read and
+        # written straight on the instance dictionary instead of through the properties.
+        self.__mangled = any(a != c for c, a in self.__attributes.items())
+        # Instances with __dict__ or a slot for the snapshot can have their changes tracked.
+        self.__trackable = bool(getattr(model, '__dictoffset__', 0)) or \
+            any(SNAPSHOT in getattr(c, '__slots__', ()) for c in model.__mro__)
+        self.__hydrators = {}
+        keys = tuple(self.__attributes[c] for c in self.__columns)
+        if self.__mangled:
+            self.__reader = ModelMetadata.__tuple(operator.itemgetter(*keys), len(keys))
+        else:
+            self.__reader = ModelMetadata.__tuple(operator.attrgetter(*keys), len(keys))
+
+    @staticmethod
+    def __tuple(getter, size):
+        if size == 1:
+            return lambda source: (getter(source),)
+        return getter
+
+    @staticmethod
+    def discover(model):
+        '''
+        Method:      discover
+        Description: Discovers the columns of a model class from the attributes of a new instance.
+                     Name mangled attributes (self.__name) are mapped to the column name.
+        Parameters:
+            model:   The model class.
+        Return:      A dictionary with the column names (in order) mapped to the instance attributes.
+        Usage:       ModelMetadata.discover(Produto) => {'id': '_Produto__id', ...}
+        '''
+        prefix = '_%s__' % model.__name__
+        columns = {}
+        for attr in model().__dict__.keys():
+            if attr.startswith(prefix):
+                columns[attr[len(prefix):]] = attr
+            elif not attr.startswith('_'):
+                columns[attr] = attr
+        return columns
+
+    @property
+    def model(self):
+        return self.__model
+
+    @property
+    def table(self):
+        return self.__table
+
+    @property
+    def columns(self):
+        return self.__columns
+
+    @property
+    def primary_key(self):
+        return self.__primary_key
+
+    @property
+    def types(self):
+        return self.__types
+
+    @property
+    def attributes(self):
+        return self.__attributes
+
+    def has_column(self, column):
+        '''
+        Method:      has_column
+        Description: Checks if the model has the column.
+        Parameters:
+            self:    The current object reference.
+            column:  The column name (string).
+        Return:      A boolean (True or False).
+        Usage:       meta.has_column('nome')
+        '''
+        return column in self.__column_set
+
+    def values(self, obj):
+        '''
+        Method:      values
+        Description: Returns the values of all the columns of an object, in the order of the columns.
+        Parameters:
+            self:    The current object reference.
+            obj:     An instance of the model class.
+        Return:      A tuple - ().
+        Usage:       meta.values(p) => (1, 'CD', 21.0)
+        '''
+        if self.__mangled:
+            return self.__reader(obj.__dict__)
+        return self.__reader(obj)
+
+    def assign(self, obj, data):
+        '''
+        Method:      assign
+        Description: Copies the values of a dictionary (column name => value) to an object.
+        Parameters:
+            self:    The current object reference.
+            obj:     An instance of the model class.
+            data:    A dictionary - {}.
+        Return:      none.
+        Usage:       meta.assign(p, {'nome': 'CD', 'preco': 21.0})
+        '''
+        attributes = self.__attributes
+        if self.__mangled:
+            obj.__dict__.update((attributes.get(k, k), v) for k, v in data.items())
+        else:
+            for k, v in data.items():
+                setattr(obj, attributes.get(k, k), v)
+
+    @property
+    def trackable(self):
+        return self.__trackable
+
+    def snapshot(self, obj, values=None):
+        '''
+        Method:      snapshot
+        Description: Keeps the current values of an object as the values stored in the database, the
+                     values changed after it are the dirty columns (see the changes method).
+        Parameters:
+            self:    The current object reference.
+            obj:     An instance of the model class.
+            values:  The values in the order of the columns (default None - the current values of obj).
+        Return:      none.
+        Usage:       meta.snapshot(p)
+        '''
+        if self.__trackable:
+            if values is None:
+                values = self.values(obj)
+            object.__setattr__(obj, SNAPSHOT, values)
+
+    def forget(self, obj):
+        '''
+        Method:      forget
+        Description: Discards the snapshot of an object, all its columns are considered dirty again.
+        Parameters:
+            self:    The current object reference.
+            obj:     An instance of the model class.
+        Return:      none.
+        Usage:       meta.forget(p)
+        '''
+        if getattr(obj, SNAPSHOT, None) is not None:
+            object.__setattr__(obj, SNAPSHOT, None)
+
+    def changes(self, obj):
+        '''
+        Method:      changes
+        Description: Returns the columns of an object whose values changed since its snapshot.
+        Parameters:
+            self:    The current object reference.
+            obj:     An instance of the model class.
+        Return:      A tuple with the dirty column names (in the order of the columns), or None when the
+                     object has no snapshot (it was not loaded through a DAO).
+        Usage:       meta.changes(p) => ('preco',)
+        '''
+        original = getattr(obj, SNAPSHOT, None)
+        if original is None:
+            return None
+        return tuple(c for c, old, new in zip(self.__columns, original, self.values(obj))
+                     if old is not new and old != new)
+
+    def hydrator(self, columns):
+        '''
+        Method:      hydrator
+        Description: Returns a function that creates an object of the model class from a row (tuple) with
+                     the given columns, in that order. The function is built once per column set.
+                     The objects created keep a snapshot of the values read (see the snapshot method).
+        Parameters:
+            self:    The current object reference.
+            columns: A tuple with the column names of the rows.
+        Return:      A function (row => object).
+        Usage:       hydrate = meta.hydrator(('id', 'nome'))
+                     p = hydrate((1, 'CD'))
+        '''
+        hydrate = self.__hydrators.get(columns)
+        if hydrate is None:
+            hydrate = self.__hydrators[columns] = self.__hydrator(columns)
+        return hydrate
+
+    def __hydrator(self, columns):
+        model = self.__model
+        attributes = self.__attributes
+        # When the row has all the columns, in order, it is the snapshot itself.
+        full = tuple(columns) == self.__columns
+        if self.__mangled:
+            keys = tuple(attributes.get(c, c) for c in columns)
+            values = self.values
+
+            def hydrate(row):
+                obj = model()
+                data = obj.__dict__
+                data.update(zip(keys, row))
+                data[SNAPSHOT] = tuple(row) if full else values(obj)
+                return obj
+            return hydrate
+        names = ['row_%d' % i for i in range(len(columns))]
+        lines = ['def hydrate(row):']
+        fields = getattr(model, '__fields__', None)
+        if fields is None:
+            lines.append('    obj = model()')
+        else:
+            # Models declared with Field skip __init__, the columns not selected get their default.
+            lines.append('    obj = new(model)')
+        if columns:
+            lines.append('    %s, = row' % ', '.join(names))
+            lines.extend('    obj.%s = %s' % (attributes.get(c, c), n) for c, n in zip(columns, names))
+        scope = {'model': model, 'new': object.__new__}
+        for k, field in fields or ():
+            if k not in columns:
+                scope['default_%s' % k] = field.default
+                lines.append('    obj.%s = default_%s' % (k, k))
+        if self.__trackable:
+            scope['values'] = self.values
+            lines.append('    obj.%s = %s' % (SNAPSHOT, 'tuple(row)' if full else 'values(obj)'))
+        lines.append('    return obj')
+        exec('\n'.join(lines) + '\n', scope)
+        return scope['hydrate']
+
+
+# Metadata of the model classes, built once per class and shared by every GenericDAO.
+_registry = {}
+_lock = threading.Lock()
+
+
+def register(model, table=None, columns=None, primary_key='id', types=None, attributes=None):
+    '''
+    Function:    register
+    Description: Declares explicitly the metadata of a model class.
+                 NOTE: See the ModelMetadata class to understand the parameters.
+    Return:      The ModelMetadata of the model class.
+    Usage:       register(Produto, table='produtos', columns=['id', 'nome', 'preco'],
+                          types={'id': int, 'nome': str, 'preco': float})
+    '''
+    meta = ModelMetadata(model, table=table, columns=columns, primary_key=primary_key,
+                         types=types, attributes=attributes)
+    with _lock:
+        _registry[model] = meta
+    return meta
+
+
+def metadata(model):
+    '''
+    Function:    metadata
+    Description: Returns the metadata of a model class, building it on the first use.
+    Parameters:
+        model:   The model class.
+    Return:      A ModelMetadata.
+    Usage:       meta = metadata(Produto)
+    '''
+    meta = _registry.get(model)
+    if meta is None:
+        with _lock:
+            meta = _registry.get(model)
+            if meta is None:
+                meta = _registry[model] = ModelMetadata(model)
+    return meta
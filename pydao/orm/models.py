@@ -7,6 +7,8 @@ Created on 28/03/2014
 @author: thiago-amm
 '''
 
+from pydao.orm.metadata import register
+
 class Produto(object):
     
     def __init__(self):
@@ -40,4 +42,101 @@ class Produto(object):
 
     # Like toString() method in Java.
     def __str__(self):
-        return '%s\nNome: %s\nPreço: %s' % (str(self.__id), str(self.__nome), str(self.__preco) )
\ No newline at end of file
+        return '%s\nNome: %s\nPreço: %s' % (str(self.__id), str(self.__nome), str(self.__preco) )
+
+
+class Field(object):
+    '''
+    Class:       Field
+    Module:      pydao.models
+    Description: Declares a column of a model class that extends Model.
+    '''
+
+    def __init__(self, type=None, default=None, primary_key=False):
+        '''
+        Method:          __init__
+        Description:     Constructor that initializes objects of this class.
+                         NOTE: it is a magic method.
+        Parameters:
+            self:        The current object reference.
+            type:        The Python type of the column values (default None).
+            default:     The value of the attribute in new objects (default None), use immutable values.
+            primary_key: Indicates whether the column is the primary key (default False).
+        Return:          none.
+        Usage:           preco = Field(float, default=0.0)
+        '''
+        self.type = type
+        self.default = default
+        self.primary_key = primary_key
+
+
+class ModelMeta(type):
+    '''
+    Class:       ModelMeta
+    Module:      pydao.models
+    Description: Metaclass of Model: turns the Field declarations of a class into __slots__, generates
+                 the __init__ method and registers the metadata of the class (see pydao.orm.metadata).
+    '''
+
+    def __new__(mcs, name, bases, namespace):
+        fields = []
+        for base in reversed(bases):
+            fields.extend(getattr(base, '__fields__', ()))
+        inherited = set(f[0] for f in fields)
+        declared = [(k, v) for k, v in namespace.items() if isinstance(v, Field)]
+        for k, v in declared:
+            # The slot descriptor takes the place of the declaration in the class.
+            del namespace[k]
+            if k in inherited:
+                fields = [f for f in fields if f[0] != k]
+            fields.append((k, v))
+        namespace['__slots__'] = tuple(namespace.get('__slots__', ())) + \
+            tuple(k for k, v in declared if k not in inherited)
+        namespace['__fields__'] = tuple(fields)
+        if fields and '__init__' not in namespace:
+            namespace['__init__'] = ModelMeta.__init_method(fields)
+        cls = type.__new__(mcs, name, bases, namespace)
+        if fields:
+            primary_key = [k for k, v in fields if v.primary_key]
+            register(
+                cls, table=namespace.get('__table__'), columns=[k for k, v in fields],
+                primary_key=primary_key[0] if primary_key else 'id',
+                types=dict((k, v.type) for k, v in fields if v.type),
+                attributes=dict((k, k) for k, v in fields)
+            )
+        return cls
+
+    @staticmethod
+    def __init_method(fields):
+        # Generates def __init__(self, id=None, nome=None): self.id = id; self.nome = nome
+        # which is faster than looping over the fields on every new object.
+        defaults = dict(('_default_%s' % k, v.default) for k, v in fields)
+        source = 'def __init__(self, %s):\n%s\n' % (
+            ', '.join('%s=_default_%s' % (k, k) for k, v in fields),
+            '\n'.join('    self.%s = %s' % (k, k) for k, v in fields)
+        )
+        exec(source, defaults)
+        return defaults['__init__']
+
+
+class Model(object, metaclass=ModelMeta):
+    '''
+    Class:       Model
+    Module:      pydao.models
+    Description: Base class of compact model classes. The columns are declared with Field and stored in
+                 __slots__ (no instance __dict__), with plain attribute access and a generated __init__.
+                 The table name is derived from the class name unless __table__ is declared.
+    Usage:       class Item(Model):
+                     __table__ = 'produtos'
+                     id = Field(int, primary_key=True)
+                     nome = Field(str)
+                     preco = Field(float, default=0.0)
+
+                 item = Item(nome='CD George Michael', preco=21.0)
+    '''
+    # The values read from the database, to find the dirty columns (see ModelMetadata.snapshot).
+    __slots__ = ('_pydao_snapshot',)
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(
+            '%s=%r' % (k, getattr(self, k, None)) for k, v in self.__fields__))
@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Created on 28/03/2014
+
+@author: thiago-amm
+'''
+
+__author__ = 'Thiago Alexandre Martins Monteiro'
+__date__ = '24/11/2012'
+
+
+class Query(object):
+    '''
+    Class:       Query
+    Module:      pydao.query
+    Description: Lazy and composable query over the table of a GenericDAO. Every method returns a new Query,
+                 the statement is built with bound parameters and only runs when the query is iterated or
+                 when count, exists, sum, min, max or avg are called, these run in the database server.
+    Usage:       for p in gd.query().filter(preco__lt=20).order_by('-id').limit(50):
+                     print(p.nome)
+                 total = gd.query().filter(nome__like='CD%').count()
+    '''
+
+    # Lookup suffix of the filter keywords => SQL operator.
+    operators = {
+        'exact': '=', 'ne': '<>', 'lt': '<', 'lte': '<=', 'gt': '>', 'gte': '>=',
+        'like': 'LIKE', 'in': 'IN', 'isnull': 'IS NULL',
+    }
+
+    def __init__(self, dao):
+        '''
+        Method:      __init__
+        Description: Constructor that initializes objects of this class.
+                     NOTE: it is a magic method.
+        Parameters:
+            self:    The current object reference.
+            dao:     The GenericDAO of the model.
+        Return:      none.
+        Usage:       q = Query(gd) or q = gd.query()
+        '''
+        self.__dao = dao
+        # (column, operator, value)
+        self.__filters = ()
+        self.__order = ()
+        self.__limit = None
+        self.__offset = None
+        self.__fields = ()
+        self.__flat = False
+        self.__values = False
+        self.__result = None
+
+    def __clone(self, **changes):
+        query = Query(self.__dao)
+        query.__filters = self.__filters
+        query.__order = self.__order
+        query.__limit = self.__limit
+        query.__offset = self.__offset
+        query.__fields = self.__fields
+        query.__flat = self.__flat
+        query.__values = self.__values
+        for k, v in changes.items():
+            setattr(query, '_Query__%s' % k, v)
+        return query
+
+    def __column(self, column):
+        if not self.__dao.metadata.has_column(column):
+            raise ValueError('%s has no column %s' % (self.__dao.model_class.__name__, column))
+        return column
+
+    def filter(self, **conditions):
+        '''
+        Method:      filter
+        Description: Returns a new query with the conditions added (joined with AND). The keywords are column
+                     names with an optional lookup: exact, ne, lt, lte, gt, gte, like, in and isnull.
+        Parameters:
+            self:    The current object reference.
+            conditions: Keywords column[__lookup]=value.
+        Return:      A Query.
+        Usage:       gd.query().filter(preco__gte=10, preco__lt=20, nome__in=['CD', 'DVD'])
+        '''
+        filters = list(self.__filters)
+        for key, value in sorted(conditions.items()):
+            column, sep, lookup = key.partition('__')
+            lookup = lookup or 'exact'
+            if lookup not in Query.operators:
+                raise ValueError('Unknown lookup %s in %s' % (lookup, key))
+            if lookup == 'exact' and value is None:
+                lookup = 'isnull'
+                value = True
+            filters.append((self.__column(column), lookup, value))
+        return self.__clone(filters=tuple(filters))
+
+    def order_by(self, *columns):
+        '''
+        Method:      order_by
+        Description: Returns a new query ordered by the columns, prefixed with - for descending order.
+        Parameters:
+            self:    The current object reference.
+            columns: The column names.
+        Return:      A Query.
+        Usage:       gd.query().order_by('-preco', 'id')
+        '''
+        order = tuple((c[1:], True) if c.startswith('-') else (c, False) for c in columns)
+        for c, desc in order:
+            self.__column(c)
+        return self.__clone(order=order)
+
+    def limit(self, limit, offset=None):
+        '''
+        Method:      limit
+        Description: Returns a new query that returns at most limit rows, skipping offset rows.
+        Parameters:
+            self:    The current object reference.
+            limit:   The maximum number of rows.
+            offset:  The number of rows to skip (default None).
+        Return:      A Query.
+        Usage:       gd.query().order_by('id').limit(50)
+        '''
+        return self.__clone(limit=limit, offset=offset)
+
+    def values_list(self, *fields, **options):
+        '''
+        Method:      values_list
+        Description: Returns a new query whose rows are tuples with the values of the fields, or the values
+                     alone with flat=True (one field only).
+        Parameters:
+            self:    The current object reference.
+            fields:  The column names (default all the columns).
+            flat:    Return the values instead of tuples (default False).
+        Return:      A Query.
+        Usage:       ids = list(gd.query().filter(preco__lt=20).values_list('id', flat=True))
+        '''
+        flat = options.get('flat', False)
+        if flat and len(fields) != 1:
+            raise ValueError('values_list(flat=True) requires one field')
+        fields = tuple(self.__column(f) for f in fields) or self.__dao.metadata.columns
+        return self.__clone(fields=fields, flat=flat, values=True)
+
+    def __where(self, marks):
+        conn = self.__dao.connection
+        conditions, params = [], []
+        for column, lookup, value in self.__filters:
+            if lookup == 'isnull':
+                conditions.append('%s %s' % (column, 'IS NULL' if value else 'IS NOT NULL'))
+            elif lookup == 'in':
+                value = list(value)
+                if not value:
+                    conditions.append('1 = 0')
+                    continue
+                conditions.append('%s IN (%s)' % (column, ', '.join(
+                    conn.placeholder(next(marks)) for v in value)))
+                params.extend(value)
+            else:
+                conditions.append('%s %s %s' % (
+                    column, Query.operators[lookup], conn.placeholder(next(marks))))
+                params.append(value)
+        return conditions, params
+
+    def sql(self, columns=None, order=True):
+        '''
+        Method:      sql
+        Description: Returns the SELECT statement of the query and its parameters.
+        Parameters:
+            self:    The current object reference.
+            columns: The select list (default None - the fields of the query or *).
+            order:   Include the ORDER BY clause (default True).
+        Return:      A tuple (sql, params).
+        Usage:       sql, params = gd.query().filter(id=1).sql()
+        '''
+        conn = self.__dao.connection
+        marks = iter(range(conn.max_parameters))
+        conditions, params = self.__where(marks)
+        if columns is None:
+            columns = ', '.join(self.__fields) or '*'
+        sql = 'SELECT %s FROM %s' % (columns, self.__dao.model_name)
+        if conditions:
+            sql = '%s WHERE %s' % (sql, ' AND '.join(conditions))
+        if order and self.__order:
+            sql = '%s ORDER BY %s' % (sql, ', '.join(
+                '%s DESC' % c if desc else c for c, desc in self.__order))
+        if self.__limit is not None or self.__offset is not None:
+            if conn.dbms.lower() == 'oracle':
+                if self.__offset is not None:
+                    sql = '%s OFFSET %s ROWS' % (sql, conn.placeholder(next(marks)))
+                    params.append(self.__offset)
+                if self.__limit is not None:
+                    sql = '%s FETCH FIRST %s ROWS ONLY' % (sql, conn.placeholder(next(marks)))
+                    params.append(self.__limit)
+            else:
+                # MySQL and SQLite require LIMIT before OFFSET, -1 (SQLite) or a huge number means no limit.
+                sql = '%s LIMIT %s' % (sql, conn.placeholder(next(marks)))
+                params.append(self.__limit if self.__limit is not None else 2 ** 63 - 1)
+                if self.__offset is not None:
+                    sql = '%s OFFSET %s' % (sql, conn.placeholder(next(marks)))
+                    params.append(self.__offset)
+        return sql, params
+
+    def __execute(self, sql, params):
+        # Runs the statement on the connection for reads of the DAO (see GenericDAO.reading) and returns
+        # the column names and all the rows, closing the cursor.
+        with self.__dao.reading() as conn, conn.open_cursor(tuples=True) as cursor:
+            if params:
+                cursor.execute(sql, tuple(params))
+            else:
+                cursor.execute(sql)
+            return tuple(d[0] for d in cursor.description), cursor.fetchall()
+
+    def __scalar(self, expression):
+        # Aggregates ignore the order, with limit/offset the query becomes a subquery.
+        if self.__limit is None and self.__offset is None:
+            sql, params = self.sql(columns=expression, order=False)
+        else:
+            sql, params = self.sql()
+            sql = 'SELECT %s FROM (%s) pydao_subquery' % (expression, sql)
+        columns, rows = self.__execute(sql, params)
+        if not rows:
+            return None
+        return rows[0][0]
+
+    def count(self):
+        '''
+        Method:      count
+        Description: Returns the number of rows of the query, counted by the database server.
+        Parameters:
+            self:    The current object reference.
+        Return:      An integer.
+        Usage:       n = gd.query().filter(preco__lt=20).count()
+        '''
+        if self.__result is not None:
+            return len(self.__result)
+        return self.__scalar('COUNT(*)')
+
+    def exists(self):
+        '''
+        Method:      exists
+        Description: Returns a boolean that indicates whether the query has at least one row,
+                     fetching one row at most.
+        Parameters:
+            self:    The current object reference.
+        Return:      A boolean (True or False).
+        Usage:       if gd.query().filter(nome='CD').exists(): ...
+        '''
+        if self.__result is not None:
+            return bool(self.__result)
+        sql, params = self.__clone(order=(), limit=1, fields=()).sql(columns='1')
+        return len(self.__execute(sql, params)[1]) > 0
+
+    def sum(self, column):
+        '''
+        Method:      sum
+        Description: Returns the sum of a column computed by the database server.
+        Usage:       total = gd.query().sum('preco')
+        '''
+        return self.__scalar('SUM(%s)' % self.__column(column))
+
+    def min(self, column):
+        '''
+        Method:      min
+        Description: Returns the minimum value of a column computed by the database server.
+        Usage:       lowest = gd.query().min('preco')
+        '''
+        return self.__scalar('MIN(%s)' % self.__column(column))
+
+    def max(self, column):
+        '''
+        Method:      max
+        Description: Returns the maximum value of a column computed by the database server.
+        Usage:       highest = gd.query().max('preco')
+        '''
+        return self.__scalar('MAX(%s)' % self.__column(column))
+
+    def avg(self, column):
+        '''
+        Method:      avg
+        Description: Returns the average of a column computed by the database server.
+        Usage:       average = gd.query().avg('preco')
+        '''
+        return self.__scalar('AVG(%s)' % self.__column(column))
+
+    def __fetch(self):
+        if self.__result is None:
+            sql, params = self.sql()
+            columns, rows = self.__execute(sql, params)
+            meta = self.__dao.metadata
+            columns = tuple(c if meta.has_column(c) else c.lower() for c in columns)
+            if not self.__values:
+                self.__result = list(map(meta.hydrator(columns), rows))
+            elif self.__flat:
+                self.__result = [row[0] for row in rows]
+            else:
+                self.__result = [tuple(row) for row in rows]
+        return self.__result
+
+    def all(self):
+        '''
+        Method:      all
+        Description: Runs the query and returns its rows as a list.
+        Usage:       produtos = gd.query().filter(preco__lt=20).all()
+        '''
+        return list(self.__fetch())
+
+    def first(self):
+        '''
+        Method:      first
+        Description: Returns the first row of the query or None.
+        Usage:       p = gd.query().order_by('preco').first()
+        '''
+        rows = self.__clone(limit=1).__fetch() if self.__result is None else self.__result
+        return rows[0] if rows else None
+
+    def __iter__(self):
+        return iter(self.__fetch())
+
+    def __len__(self):
+        return len(self.__fetch())
+
+    def __bool__(self):
+        return self.exists()
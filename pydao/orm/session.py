@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Created on 28/03/2014
+
+@author: thiago-amm
+'''
+
+__author__ = 'Thiago Alexandre Martins Monteiro'
+__date__ = '24/11/2012'
+
+from pydao.orm.dao import GenericDAO
+
+
+class Session(object):
+    '''
+    Class:       Session
+    Module:      pydao.session
+    Description: Unit of work over a connection. Keeps an identity map with the objects loaded by
+                 (model class, primary key), so an object is loaded only once, and tracks the new, changed
+                 and deleted objects, writing them in one transaction on commit with the statements
+                 grouped by table and operation.
+    '''
+
+    def __init__(self, connection=None):
+        '''
+        Method:         __init__
+        Description:    Constructor that initializes objects of this class.
+                        NOTE: it is a magic method.
+        Parameters:
+            self:       The current object reference.
+            connection: The database connection (default None).
+        Return:         none.
+        Usage:          session = Session(conn)
+        '''
+        self.__connection = connection
+        self.__daos = {}
+        # (model class, primary key) => object
+        self.__identity = {}
+        # id(object) => values of the columns when loaded (or last written)
+        self.__snapshots = {}
+        self.__new = []
+        self.__deleted = []
+
+    @property
+    def connection(self):
+        '''
+        Property:    connection
+        Description: Returns the database connection used by this session.
+        Parameters:
+            self:    The current object reference.
+        Return:      A Connection.
+        Usage:       conn = session.connection
+        '''
+        return self.__connection
+
+    def dao(self, model):
+        '''
+        Method:      dao
+        Description: Returns the GenericDAO of a model class used by this session.
+        Parameters:
+            self:    The current object reference.
+            model:   The model class.
+        Return:      A GenericDAO.
+        Usage:       gd = session.dao(Produto)
+        '''
+        dao = self.__daos.get(model)
+        if dao is None:
+            dao = self.__daos[model] = GenericDAO(connection=self.__connection, model=model)
+        return dao
+
+    def __key(self, obj):
+        model = obj.__class__
+        return model, getattr(obj, self.dao(model).metadata.primary_key)
+
+    def __register(self, obj):
+        key = self.__key(obj)
+        loaded = self.__identity.get(key)
+        if loaded is not None:
+            return loaded
+        self.__identity[key] = obj
+        self.__snapshots[id(obj)] = self.dao(obj.__class__).metadata.values(obj)
+        return obj
+
+    def get(self, model, id):
+        '''
+        Method:      get
+        Description: Returns the object of a model class with the primary key, from the identity map when it
+                     was already loaded by this session or from the database otherwise.
+        Parameters:
+            self:    The current object reference.
+            model:   The model class.
+            id:      The primary key value.
+        Return:      An object of the model class or None if it does not exist.
+        Usage:       p = session.get(Produto, 1)
+        '''
+        obj = self.__identity.get((model, id))
+        if obj is None:
+            dao = self.dao(model)
+            where = '%s = %s' % (dao.metadata.primary_key, self.__connection.placeholder(0))
+            objs = dao.select_objects(where=where, params=(id,))
+            if not objs:
+                return None
+            obj = self.__register(objs[0])
+        return obj
+
+    def select(self, model, where='', params=()):
+        '''
+        Method:      select
+        Description: Returns the objects of a model class that match the where string (see GenericDAO.select).
+                     Objects already loaded by this session are returned instead of the new rows, keeping
+                     their pending changes.
+        Parameters:
+            self:    The current object reference.
+            model:   The model class.
+            where:   A string (default a empty string - '').
+            params:  A tuple with the values bound to the where string (default a empty tuple - ()).
+        Return:      A list of objects - [].
+        Usage:       produtos = session.select(Produto, where='preco < ?', params=(20,))
+        '''
+        return [self.__register(obj) for obj in
+                self.dao(model).select_objects(where=where, params=params) or []]
+
+    def fill(self, obj):
+        '''
+        Method:      fill
+        Description: Fills an object with the values of the register with the same primary key, without
+                     a query when the register was already loaded by this session.
+        Parameters:
+            self:    The current object reference.
+            obj:     An object of a model class with the primary key assigned.
+        Return:      none.
+        Usage:       session.fill(p)
+        '''
+        loaded = self.get(*self.__key(obj))
+        if loaded is not None and loaded is not obj:
+            meta = self.dao(obj.__class__).metadata
+            meta.assign(obj, dict(zip(meta.columns, meta.values(loaded))))
+
+    def add(self, obj):
+        '''
+        Method:      add
+        Description: Marks a new object to be inserted on the next flush.
+        Parameters:
+            self:    The current object reference.
+            obj:     An object of a model class.
+        Return:      none.
+        Usage:       session.add(p)
+        '''
+        if not any(o is obj for o in self.__new):
+            self.__new.append(obj)
+
+    def delete(self, obj):
+        '''
+        Method:      delete
+        Description: Marks an object to be deleted on the next flush.
+        Parameters:
+            self:    The current object reference.
+            obj:     An object of a model class.
+        Return:      none.
+        Usage:       session.delete(p)
+        '''
+        pending = [o for o in self.__new if o is not obj]
+        if len(pending) < len(self.__new):
+            # It was never written, forget it.
+            self.__new = pending
+        elif not any(o is obj for o in self.__deleted):
+            self.__deleted.append(obj)
+
+    @property
+    def new(self):
+        '''
+        Property:    new
+        Description: Returns the objects that will be inserted on the next flush.
+        Return:      A list - [].
+        Usage:       objs = session.new
+        '''
+        return list(self.__new)
+
+    @property
+    def dirty(self):
+        '''
+        Property:    dirty
+        Description: Returns the loaded objects whose values changed since they were loaded.
+        Return:      A list - [].
+        Usage:       objs = session.dirty
+        '''
+        return [obj for obj, columns in self.__changes()]
+
+    @property
+    def deleted(self):
+        '''
+        Property:    deleted
+        Description: Returns the objects that will be deleted on the next flush.
+        Return:      A list - [].
+        Usage:       objs = session.deleted
+        '''
+        return list(self.__deleted)
+
+    def __changes(self):
+        # Returns (object, changed columns) of the loaded objects that are not being deleted.
+        changes = []
+        for obj in self.__identity.values():
+            if any(o is obj for o in self.__deleted):
+                continue
+            meta = self.dao(obj.__class__).metadata
+            values = meta.values(obj)
+            original = self.__snapshots.get(id(obj))
+            columns = tuple(c for c, v, o in zip(meta.columns, values, original) if v != o)
+            if columns:
+                changes.append((obj, columns))
+        return changes
+
+    def __groups(self, objs):
+        # Groups the objects by model class keeping the order of the first occurrence.
+        groups = {}
+        for obj in objs:
+            groups.setdefault(obj.__class__, []).append(obj)
+        return groups.items()
+
+    def flush(self):
+        '''
+        Method:      flush
+        Description: Writes the pending changes in one transaction: one batched INSERT per table, one
+                     executemany UPDATE per table and changed column set and one DELETE ... IN per table.
+                     If a statement fails the transaction is rolled back and the error is raised.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       session.flush()
+        '''
+        conn = self.__connection
+        changes = self.__changes()
+        with conn.transaction():
+            for model, objs in self.__groups(self.__new):
+                if self.dao(model).insert_many(objs) != len(objs):
+                    raise RuntimeError('Could not insert the new %s objects.' % model.__name__)
+            updates = {}
+            for obj, columns in changes:
+                updates.setdefault((obj.__class__, columns), []).append(obj)
+            for (model, columns), objs in updates.items():
+                self.__update(model, columns, objs)
+            for model, objs in self.__groups(self.__deleted):
+                self.__delete(model, objs)
+        for obj in self.__new:
+            # Registered by the key generated by insert_many, the objects still without a key (the DBMS
+            # did not return it) would all share the key (model, None) and are not tracked.
+            if self.__key(obj)[1] is not None:
+                self.__register(obj)
+        for obj, columns in changes:
+            self.__snapshots[id(obj)] = self.dao(obj.__class__).metadata.values(obj)
+        for obj in self.__deleted:
+            self.__identity.pop(self.__key(obj), None)
+            self.__snapshots.pop(id(obj), None)
+        self.__new = []
+        self.__deleted = []
+
+    def __update(self, model, columns, objs):
+        conn = self.__connection
+        meta = self.dao(model).metadata
+        pk = meta.primary_key
+        settings = ', '.join('%s = %s' % (c, conn.placeholder(i)) for i, c in enumerate(columns))
+        sql = 'UPDATE %s SET %s WHERE %s = %s' % (
+            meta.table, settings, pk, conn.placeholder(len(columns)))
+        index = [meta.columns.index(c) for c in columns]
+        params = []
+        for obj in objs:
+            values = meta.values(obj)
+            params.append(tuple(values[i] for i in index) + (getattr(obj, pk),))
+        with conn.open_cursor(tuples=True) as cursor:
+            cursor.executemany(sql, params)
+        for obj in objs:
+            self.dao(model).invalidate(getattr(obj, pk))
+
+    def __delete(self, model, objs):
+        conn = self.__connection
+        meta = self.dao(model).metadata
+        ids = [getattr(obj, meta.primary_key) for obj in objs]
+        size = conn.max_in_list
+        with conn.open_cursor(tuples=True) as cursor:
+            for start in range(0, len(ids), size):
+                chunk = ids[start:start + size]
+                sql = 'DELETE FROM %s WHERE %s IN (%s)' % (
+                    meta.table, meta.primary_key, ', '.join(conn.placeholder(i) for i in range(len(chunk))))
+                cursor.execute(sql, chunk)
+                for id in chunk:
+                    self.dao(model).invalidate(id)
+
+    def commit(self):
+        '''
+        Method:      commit
+        Description: Flushes the pending changes (see flush), commiting them.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       session.commit()
+        '''
+        self.flush()
+
+    def rollback(self):
+        '''
+        Method:      rollback
+        Description: Discards the pending changes and empties the identity map.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       session.rollback()
+        '''
+        self.clear()
+
+    def clear(self):
+        '''
+        Method:      clear
+        Description: Empties the identity map and forgets the pending changes.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       session.clear()
+        '''
+        self.__identity.clear()
+        self.__snapshots.clear()
+        self.__new = []
+        self.__deleted = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.rollback()
+        else:
+            self.commit()
+        return False
@@ -0,0 +1,449 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+'''
+Created on 28/03/2014
+
+@author: thiago-amm
+'''
+
+__author__ = 'Thiago Alexandre Martins Monteiro'
+__date__ = '24/11/2012'
+
+import concurrent.futures
+import heapq
+import itertools
+import threading
+import zlib
+
+from pydao.orm.dao import GenericDAO
+from pydao.orm.db import row_converter
+from pydao.orm.metadata import metadata
+
+
+def hash_key(key):
+    '''
+    Function:    hash_key
+    Description: Default shard key function of ShardedDAO: the integers are their own hash (consecutive ids
+                 are spread over the shards in turns), the other values are hashed by the CRC32 of their text,
+                 which is the same in every process (unlike hash() of strings).
+    Parameters:
+        key:     The value of the shard key.
+    Return:      An integer.
+    Usage:       hash_key(42) => 42
+                 hash_key('ABC-1') => 2441379614
+    '''
+    if isinstance(key, int) and not isinstance(key, bool):
+        return key
+    return zlib.crc32(str(key).encode('utf-8'))
+
+
+class _Descending(object):
+    # Sort key of a column in descending order: compares the other way around.
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class ShardedDAO(object):
+    '''
+    Class:       ShardedDAO
+    Module:      pydao.sharding
+    Description: GenericDAO over a table split in shards, one database (connection) per shard. The shard of a
+                 register is shard_key(value of the key column) % number of shards.
+                 The reads and writes with the key (fill, insert, update and delete by id) go to the one shard
+                 of the key, the others (select, select_objects, count and update or delete without the key)
+                 run on all the shards in parallel, on a pool of threads, and the rows are merged, in order
+                 when order_by is given.
+                 NOTE: the keys are not generated by the databases (each shard would generate the same ids),
+                 the inserts must have the value of the key column (use connections without auto_increment,
+                 the default, so the primary key of the objects is inserted).
+                 NOTE: to call it from many threads use a ThreadLocalConnection for each shard.
+    '''
+
+    def __init__(self, connections=(), model=None, shard_key=hash_key, key=None, max_workers=None):
+        '''
+        Method:          __init__
+        Description:     Constructor that initializes objects of this class.
+                         NOTE: it is a magic method.
+        Parameters:
+            self:        The current object reference.
+            connections: A list with the connections (or ConnectionProviders) of the shards, in order.
+            model:       The model class.
+            shard_key:   A function that returns an integer from the value of the key (default hash_key).
+            key:         The shard key column (default None - the primary key of the model).
+            max_workers: The number of threads of the queries on all the shards (default None - one per shard).
+        Return:          none.
+        Usage:           sd = ShardedDAO([conn1, conn2, conn3], Produto)
+                         sd.insert(settings={'id': 10, 'nome': 'CD', 'preco': 21.0})
+                         rows = sd.select(where='preco < ?', params=(20,), order_by='-preco', limit=10)
+        '''
+        if not connections:
+            raise ValueError('ShardedDAO requires at least one connection')
+        self.__daos = tuple(GenericDAO(connection=c, model=model) for c in connections)
+        self.__model = model
+        self.__metadata = metadata(model)
+        self.__shard_key = shard_key
+        self.__key = key or self.__metadata.primary_key
+        self.__max_workers = max_workers or len(self.__daos)
+        self.__executor = None
+        self.__lock = threading.Lock()
+
+    @property
+    def daos(self):
+        '''
+        Property:    daos
+        Description: Returns the GenericDAO of each shard, in the order of the connections.
+        Parameters:
+            self:    The current object reference.
+        Return:      A tuple of GenericDAO.
+        Usage:       for gd in sd.daos: gd.select()
+        '''
+        return self.__daos
+
+    @property
+    def model(self):
+        return self.__model
+
+    @property
+    def key(self):
+        return self.__key
+
+    def shard(self, value):
+        '''
+        Method:      shard
+        Description: Returns the index of the shard of a value of the key.
+        Parameters:
+            self:    The current object reference.
+            value:   The value of the key column.
+        Return:      An integer.
+        Usage:       sd.shard(42) => 0
+        '''
+        return self.__shard_key(value) % len(self.__daos)
+
+    def dao(self, value):
+        '''
+        Method:      dao
+        Description: Returns the GenericDAO of the shard of a value of the key.
+        Parameters:
+            self:    The current object reference.
+            value:   The value of the key column.
+        Return:      A GenericDAO.
+        Usage:       sd.dao(42).select(where='id = 42')
+        '''
+        return self.__daos[self.shard(value)]
+
+    def __value(self, item):
+        # Value of the key of an object or dictionary, None when it is missing.
+        if isinstance(item, dict):
+            return item.get(self.__key)
+        return getattr(item, self.__key, None)
+
+    def __keyed(self, item, operation):
+        # GenericDAO of the shard of an object or dictionary with the key.
+        value = self.__value(item) if item else None
+        if value is None:
+            raise ValueError('%s: the value of the shard key (%s) is required' % (operation, self.__key))
+        return self.dao(value)
+
+    def __map(self, function, items):
+        # Runs function on each item, on the threads when there is more than one.
+        items = list(items)
+        if len(items) < 2:
+            return [function(item) for item in items]
+        if self.__executor is None:
+            with self.__lock:
+                if self.__executor is None:
+                    self.__executor = concurrent.futures.ThreadPoolExecutor(
+                        max_workers=self.__max_workers, thread_name_prefix='pydao-shard'
+                    )
+        return list(self.__executor.map(function, items))
+
+    def insert(self, obj=None, settings={}):
+        '''
+        Method:       insert
+        Description:  Inserts an object or dictionary (see GenericDAO.insert) in the shard of its key.
+        Parameters:
+            self:     The current object reference.
+            obj:      The object that will be insert (default None).
+            settings: A dictionary with the data that will be inserted (default a empty dictionary - {}).
+        Return:       none.
+        Usage:        sd.insert(settings={'id': 7, 'nome': 'CD', 'preco': 21.0})
+        '''
+        item = obj or settings
+        try:
+            dao = self.__keyed(item, 'insert')
+        except Exception as e:
+            print(e)
+            return
+        value = self.__value(item)
+        dao.insert(obj=obj, settings=settings)
+        # The key is the one the register was routed by, so the next calls find it in the same shard.
+        if isinstance(item, dict):
+            item[self.__key] = value
+        else:
+            setattr(item, self.__key, value)
+
+    def insert_many(self, objs=[], batch_size=1000):
+        '''
+        Method:         insert_many
+        Description:    Inserts objects or dictionaries (see GenericDAO.insert_many), grouped by shard, the shards
+                        in parallel.
+        Parameters:
+            self:       The current object reference.
+            objs:       A list of objects or dictionaries with the key (default a empty list - []).
+            batch_size: The number of rows per INSERT (default 1000).
+        Return:         The number of rows inserted (int).
+        Usage:          sd.insert_many([{'id': i, 'nome': 'P%d' % i, 'preco': 1.0} for i in range(1000)])
+        '''
+        groups = {}
+        try:
+            for item in objs:
+                value = self.__value(item)
+                if value is None:
+                    raise ValueError('insert_many: the value of the shard key (%s) is required' % self.__key)
+                groups.setdefault(self.shard(value), []).append(item)
+        except Exception as e:
+            print(e)
+            return 0
+        counts = self.__map(
+            lambda group: self.__daos[group[0]].insert_many(group[1], batch_size), groups.items())
+        return sum(c or 0 for c in counts)
+
+    def update(self, obj=None, settings={}, where={}):
+        '''
+        Method:       update
+        Description:  Updates an object or registers (see GenericDAO.update): in the shard of the key of obj or
+                      of the where dictionary, or in all the shards when where has no key.
+        Parameters:
+            self:     The current object reference.
+            obj:      The object that will be updated (default None).
+            settings: A dictionary with the new values (default a empty dictionary - {}).
+            where:    A dictionary with the conditions (default a empty dictionary - {}).
+        Return:       none.
+        Usage:        sd.update(p) or
+                      sd.update(settings={'preco': 0.0}, where={'nome': 'CD'})
+        '''
+        if obj:
+            try:
+                dao = self.__keyed(obj, 'update')
+            except Exception as e:
+                print(e)
+                return
+            dao.update(obj=obj)
+        elif self.__value(where) is not None:
+            self.dao(self.__value(where)).update(settings=settings, where=where)
+        else:
+            self.__map(lambda dao: dao.update(settings=settings, where=where), self.__daos)
+
+    def delete(self, obj=None, where={}):
+        '''
+        Method:      delete
+        Description: Deletes an object or registers (see GenericDAO.delete): in the shard of the key of obj or
+                     of the where dictionary, or in all the shards when where has no key.
+        Parameters:
+            self:    The current object reference.
+            obj:     The object that will be deleted (default None).
+            where:   A dictionary with the conditions (default a empty dictionary - {}).
+        Return:      none.
+        Usage:       sd.delete(p) or
+                     sd.delete(where={'id': 7})
+        '''
+        if obj:
+            try:
+                dao = self.__keyed(obj, 'delete')
+            except Exception as e:
+                print(e)
+                return
+            dao.delete(obj=obj)
+        elif self.__value(where) is not None:
+            self.dao(self.__value(where)).delete(where=where)
+        else:
+            self.__map(lambda dao: dao.delete(where=where), self.__daos)
+
+    def fill(self, obj=None, dic={}):
+        '''
+        Method:      fill
+        Description: Fills an object or dictionary (see GenericDAO.fill) from the shard of its key.
+        Parameters:
+            self:    The current object reference.
+            obj:     The object with the key (default None).
+            dic:     A dictionary with the key (default a empty dictionary - {}).
+        Return:      none.
+        Usage:       p = Produto(); p.id = 7; sd.fill(p)
+        '''
+        try:
+            dao = self.__keyed(obj or dic, 'fill')
+        except Exception as e:
+            print(e)
+            return
+        dao.fill(obj=obj, dic=dic)
+
+    def __sql(self, dao, conn, columns, where, params, order, limit):
+        # SELECT of one shard, with the order and the limit of the whole result.
+        sql = 'SELECT %s FROM %s' % (columns, dao.model_name)
+        if where and isinstance(where, str):
+            sql = '%s WHERE %s' % (sql, where)
+        if order:
+            sql = '%s ORDER BY %s' % (sql, ', '.join('%s DESC' % c if desc else c for c, desc in order))
+        params = list(params)
+        if limit is not None:
+            if conn.dbms.lower() == 'oracle':
+                sql = '%s FETCH FIRST %s ROWS ONLY' % (sql, conn.placeholder(len(params)))
+            else:
+                sql = '%s LIMIT %s' % (sql, conn.placeholder(len(params)))
+            params.append(limit)
+        return sql, params
+
+    def __gather(self, columns, where, params, order=(), limit=None):
+        # Runs the SELECT on all the shards in parallel, returns the column names, the rows (tuples) of each
+        # shard and whether the NULLs come first in ascending order.
+        meta = self.__metadata
+
+        def fetch(dao):
+            with dao.reading() as conn, conn.open_cursor(tuples=True) as cursor:
+                sql, values = self.__sql(dao, conn, columns, where, params, order, limit)
+                if values:
+                    cursor.execute(sql, tuple(values))
+                else:
+                    cursor.execute(sql)
+                names = tuple(d[0] if meta.has_column(d[0]) else d[0].lower() for d in cursor.description)
+                return names, cursor.fetchall(), conn.dbms.lower() in ('mysql', 'sqlite')
+        results = self.__map(fetch, self.__daos)
+        return results[0][0], [rows for names, rows, nulls_first in results], results[0][2]
+
+    def __merge(self, columns, shards, order, limit, nulls_first):
+        # Merges the rows of the shards (each one sorted by the database) in the order of the whole result.
+        if not order:
+            rows = itertools.chain.from_iterable(shards)
+        else:
+            index = [columns.index(c) for c, desc in order]
+            # The NULLs are sorted like the database does: first (MySQL, SQLite) or last (PostgreSQL, Oracle)
+            # in ascending order and the other way around in descending order.
+            null = 0 if nulls_first else 1
+
+            def value(v):
+                return (null, v) if v is None else (1 - null, v)
+            if len(order) == 1:
+                i = index[0]
+                rows = heapq.merge(*shards, key=lambda row: value(row[i]), reverse=order[0][1])
+            else:
+                keys = tuple((i, desc) for i, (c, desc) in zip(index, order))
+
+                def key(row):
+                    return tuple(_Descending(value(row[i])) if desc else value(row[i]) for i, desc in keys)
+                rows = heapq.merge(*shards, key=key)
+        if limit is not None:
+            rows = itertools.islice(rows, limit)
+        return list(rows)
+
+    def __select(self, fields, where, params, order_by, limit):
+        # Column names and rows (tuples) of the select on all the shards.
+        if isinstance(order_by, str):
+            order_by = [order_by]
+        order = tuple((c[1:], True) if c.startswith('-') else (c, False) for c in order_by or ())
+        if fields and isinstance(fields, (list, tuple)):
+            # The order_by columns are needed to merge the rows.
+            fields = tuple(fields) + tuple(c for c, desc in order if c not in fields)
+        else:
+            fields = ()
+        columns, shards, nulls_first = self.__gather(', '.join(fields) or '*', where, params, order, limit)
+        return columns, self.__merge(columns, shards, order, limit, nulls_first)
+
+    def select(self, fields=[], where='', params=(), order_by=None, limit=None):
+        '''
+        Method:       select
+        Description:  Returns the rows of a select (see GenericDAO.select) on all the shards, run in parallel.
+                      With order_by the rows of the shards (each one sorted and limited by its database) are
+                      merged in order, otherwise they come shard after shard.
+        Parameters:
+            self:     The current object reference.
+            fields:   A list (default a empty list - []), the order_by columns are added when missing.
+            where:    A string (default a empty string - '').
+            params:   A tuple with the values bound to the where string (default a empty tuple - ()).
+            order_by: A column name or a list of column names, prefixed with - for descending order
+                      (default None).
+            limit:    The maximum number of rows (default None - all the rows).
+        Return:       A list - [] with the rows in the shape of the row factory of the connection of the first
+                      shard (see Connection.row_factory).
+        Usage:        sd.select(where='preco < ?', params=(20,), order_by=['-preco', 'id'], limit=10)
+        '''
+        try:
+            columns, rows = self.__select(fields, where, params, order_by, limit)
+        except Exception as e:
+            print(e)
+            return []
+        convert = row_converter(self.__daos[0].connection.row_factory, columns)
+        if convert is None:
+            return rows
+        return list(map(convert, rows))
+
+    def select_objects(self, fields=[], where='', params=(), order_by=None, limit=None):
+        '''
+        Method:       select_objects
+        Description:  Returns the rows of a select on all the shards (see the select method) as objects of the
+                      model class.
+        Parameters:
+            self:     The current object reference.
+            fields:   A list (default a empty list - []).
+            where:    A string (default a empty string - '').
+            params:   A tuple with the values bound to the where string (default a empty tuple - ()).
+            order_by: A column name or a list of column names (default None).
+            limit:    The maximum number of rows (default None - all the rows).
+        Return:       A list of objects - [].
+        Usage:        for p in sd.select_objects(order_by='-preco', limit=10):
+                          print(p.nome)
+        '''
+        try:
+            columns, rows = self.__select(fields, where, params, order_by, limit)
+        except Exception as e:
+            print(e)
+            return []
+        return list(map(self.__metadata.hydrator(columns), rows))
+
+    def count(self, where='', params=()):
+        '''
+        Method:      count
+        Description: Returns the number of registers on all the shards, counted in parallel.
+        Parameters:
+            self:    The current object reference.
+            where:   A string (default a empty string - '').
+            params:  A tuple with the values bound to the where string (default a empty tuple - ()).
+        Return:      An integer or None on errors.
+        Usage:       sd.count(where='preco < ?', params=(20,))
+        '''
+        try:
+            columns, shards, nulls_first = self.__gather('COUNT(*)', where, params)
+        except Exception as e:
+            print(e)
+            return None
+        return sum(rows[0][0] for rows in shards)
+
+    def close(self):
+        '''
+        Method:      close
+        Description: Waits for the running queries and stops the threads, the connections are not closed.
+        Parameters:
+            self:    The current object reference.
+        Return:      none.
+        Usage:       sd.close()
+        '''
+        with self.__lock:
+            if self.__executor is not None:
+                self.__executor.shutdown(wait=True)
+                self.__executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False